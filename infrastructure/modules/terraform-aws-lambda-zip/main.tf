@@ -66,6 +66,7 @@ data "aws_iam_policy_document" "lambda_permissions" {
       actions = [
         "dynamodb:DescribeTable",
         "dynamodb:GetItem",
+        "dynamodb:BatchGetItem",
         "dynamodb:PutItem",
         "dynamodb:UpdateItem",
         "dynamodb:Query",
@@ -54,4 +54,20 @@ module "dynamodb_table_wallet" {
 
   enable_ttl = false
   tags       = var.tags
-}
\ No newline at end of file
+}
+
+module "dynamodb_table_payment_idempotency" {
+  source       = "../modules/terraform-aws-dynamodb"
+  table_name   = "PaymentIdempotency"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "checkout_id"
+  range_key    = null
+
+  attributes = [
+    { name = "checkout_id", type = "S" }
+  ]
+
+  enable_ttl    = true
+  ttl_attribute = "expires_at"
+  tags          = var.tags
+}
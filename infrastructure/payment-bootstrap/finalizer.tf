@@ -8,6 +8,8 @@ module "lambda_executor" {
     PAYMENT_ORDER_TABLE       = module.dynamodb_table_payment_order.table_name
     PAYMENT_RESULTS_QUEUE_URL = module.payment_results_queue.queue_url
     PSP_URL                   = module.api_gateway_psp.invoke_url
+    MAX_RECORD_CONCURRENCY    = "10"
+    IDEMPOTENCY_TABLE         = module.dynamodb_table_payment_idempotency.table_name
   })
   lambda_layers_arns = var.lambda_layers_arns
 
@@ -17,7 +19,8 @@ module "lambda_executor" {
 
   dynamodb_table_arns = [
     module.dynamodb_table_payment_event.table_arn,
-    module.dynamodb_table_payment_order.table_arn
+    module.dynamodb_table_payment_order.table_arn,
+    module.dynamodb_table_payment_idempotency.table_arn
   ]
   sqs_queue_arns = [
     module.payment_execution_queue.queue_arn,
@@ -33,6 +33,11 @@ output "dynamodb_wallet_table_name" {
   value       = module.dynamodb_table_wallet.table_name
 }
 
+output "dynamodb_payment_idempotency_table_name" {
+  description = "Name of the PaymentIdempotency DynamoDB table"
+  value       = module.dynamodb_table_payment_idempotency.table_name
+}
+
 output "payment_execution_queue_name" {
   description = "Name of the payment execution SQS queue"
   value       = module.payment_execution_queue.queue_name
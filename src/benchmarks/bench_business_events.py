@@ -0,0 +1,103 @@
+"""CPU and log volume of business-event emission per variant.
+
+Emits a batch's worth of executor-sized events through a Powertools Logger
+writing to memory and reports per-event CPU and log bytes for the previous
+per-Lambda function, the shared emitter, and the shared emitter with a sample
+rate on the success events.
+
+    python -m benchmarks.bench_business_events --events 100 --json events.json
+"""
+import argparse
+import io
+import itertools
+import json
+import logging
+from datetime import datetime, timezone
+
+from aws_lambda_powertools import Logger
+
+from benchmarks.support import bench
+from payments_common.business_events import BusinessEventEmitter
+
+_service_ids = itertools.count()
+
+EVENT_DATA = {
+    "psp.status_code": 200,
+    "psp.latency.ms": 231.4,
+    "amount.total": "126.00",
+    "amount.currency": "USD",
+    "simulate": False,
+}
+
+
+def memory_logger() -> tuple:
+    stream = io.StringIO()
+    logger = Logger(service=f"bench-events-{next(_service_ids)}", logger_handler=logging.StreamHandler(stream))
+    return logger, stream
+
+
+def legacy_emitter(logger: Logger):
+    def log_business_event(msg, event_type, checkout_id, outcome, stage="EXECUTION", data=None):
+        logger.info(msg,
+            event_type=event_type,
+            event_provider="payment-service",
+            event_version="1.0",
+            biz_checkout_id=checkout_id,
+            biz_timestamp=datetime.now(timezone.utc).isoformat(),
+            outcome=outcome,
+            stage=stage,
+            **(data or {})
+        )
+    return log_business_event
+
+
+def shared_emitter(sample_rates: dict):
+    def build(logger: Logger):
+        return BusinessEventEmitter(logger, default_stage="EXECUTION", sample_rates=sample_rates).emit
+    return build
+
+
+VARIANTS = {
+    "legacy": legacy_emitter,
+    "shared": shared_emitter({}),
+    "sampled_0.1": shared_emitter({"payment.psp.response": 0.1}),
+}
+
+
+def run_invocation(emit, events: int) -> None:
+    for index in range(events):
+        emit(msg="PSP response received", event_type="payment.psp.response", checkout_id=f"chk-{index}",
+             outcome="SUCCESS", stage="PSP_INTEGRATION", data=EVENT_DATA)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100, help="events per invocation")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'variant':>12} {'us/event':>10} {'bytes/event':>12} {'lines/inv':>10}")
+    for name, build in VARIANTS.items():
+        logger, stream = memory_logger()
+        emit = build(logger)
+        timing = bench(lambda: run_invocation(emit, args.events), repeat=3)
+
+        stream.seek(0)
+        stream.truncate()
+        run_invocation(emit, args.events)
+        output = stream.getvalue()
+        per_event_us = timing["median_us"] / args.events
+        per_event_bytes = len(output.encode()) / args.events
+        lines = output.count("\n")
+        results.append({"variant": name, "events": args.events, "timing": timing,
+                        "us_per_event": per_event_us, "bytes_per_event": per_event_bytes, "lines": lines})
+        print(f"{name:>12} {per_event_us:>10.2f} {per_event_bytes:>12.1f} {lines:>10}")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"benchmark": "business_events", "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
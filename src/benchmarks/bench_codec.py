@@ -0,0 +1,86 @@
+"""Per-message CPU of JSON encoding and decoding, previous path vs payments_common.codec.
+
+Covers the initializer's 202 body (previous json.dumps of model_dump() with
+default=str, RESPONSE_MODE=full through model_dump_json, RESPONSE_MODE=slim),
+the execution message sent to SQS and the parsing of the SQS bodies by the
+executor and the wallet, for checkouts of 1, 10 and 500 orders. The codec
+backend (orjson or json) is the one installed in the running interpreter.
+
+    python -m benchmarks.bench_codec --json codec.json
+"""
+import argparse
+import json
+
+from benchmarks.bench_initializer_parsing import build_body
+from benchmarks.support import bench, load_lambda
+from payments_common import codec
+
+initializer = load_lambda("initializer")
+executor = load_lambda("executor")
+wallet = load_lambda("wallet")
+
+
+def build_cases(order_count: int) -> dict:
+    payment = initializer.PaymentEvent.model_validate_json(build_body(order_count))
+    execution_message = initializer.build_execution_message(payment)
+    execution_body = json.dumps(execution_message)
+    result_body = json.dumps({"checkout_id": payment.checkout_id, "status": "SUCCESS", "error_code": None,
+                              "simulate": {}, "schema_version": 2, "orders": execution_message.get("orders")})
+    accepted = initializer.PaymentAccepted(payment_event=payment)
+    slim = {"checkout_id": payment.checkout_id, "message": "Payment event initiated"}
+
+    # name -> (previous, current)
+    return {
+        "response_body": (
+            lambda: json.dumps({"payment_event": payment.model_dump(), "message": "Payment event initiated"}, default=str),
+            lambda: codec.dumps(accepted),
+        ),
+        "response_body_slim": (
+            lambda: json.dumps({"payment_event": payment.model_dump(), "message": "Payment event initiated"}, default=str),
+            lambda: codec.dumps(slim),
+        ),
+        "execution_message_dumps": (
+            lambda: json.dumps(execution_message),
+            lambda: codec.dumps(execution_message),
+        ),
+        "executor_record_parse": (
+            lambda: executor.ExecutionMessage.model_validate(json.loads(execution_body)),
+            lambda: executor.ExecutionMessage.model_validate_json(execution_body),
+        ),
+        "wallet_record_parse": (
+            lambda: wallet.PaymentResultMessage.model_validate(json.loads(result_body)),
+            lambda: wallet.PaymentResultMessage.model_validate_json(result_body),
+        ),
+        "wallet_prefetch_loads": (
+            lambda: json.loads(result_body),
+            lambda: codec.loads(result_body),
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[1, 10, 500])
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    print(f"codec backend: {codec.JSON_BACKEND}")
+    results = []
+    print(f"{'case':>24} {'orders':>7} {'previous us':>12} {'current us':>11} {'saved %':>8}")
+    for order_count in args.orders:
+        for name, (previous_path, current_path) in build_cases(order_count).items():
+            previous = bench(previous_path)
+            current = bench(current_path)
+            saved = previous["median_us"] - current["median_us"]
+            results.append({"case": name, "orders": order_count, "previous": previous, "current": current,
+                            "saved_us": saved})
+            print(f"{name:>24} {order_count:>7} {previous['median_us']:>12.1f} {current['median_us']:>11.1f} "
+                  f"{saved / previous['median_us'] * 100:>7.1f}%")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"benchmark": "codec", "backend": codec.JSON_BACKEND, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
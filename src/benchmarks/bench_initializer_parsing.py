@@ -0,0 +1,81 @@
+"""Per-request CPU of the initializer's request parsing.
+
+Compares the previous path (json.loads, a manual Decimal sum for the first
+log line, model_validate on the dict and derived fields recomputed on every
+read) with the current one (model_validate_json on the raw body and derived
+fields cached on the model), for checkouts of 1, 10 and 500 orders.
+
+    python -m benchmarks.bench_initializer_parsing --json parsing.json
+"""
+import argparse
+import json
+from decimal import Decimal
+
+from benchmarks.support import bench, load_lambda
+
+initializer = load_lambda("initializer")
+
+# every request reads total_amount and currency for two business events and the SQS body
+DERIVED_READS = 3
+
+
+def build_body(order_count: int) -> str:
+    return json.dumps({
+        "checkout_id": "chk-benchmark",
+        "buyer_info": {"user_id": "buyer-1", "email": "buyer@example.com"},
+        "credit_card_info": {"payment_token": "tok_benchmark"},
+        "payment_orders": [
+            {
+                "payment_order_id": f"po-{index}",
+                "seller_account": f"seller-acct-{index % 10:03d}",
+                "amount": "42",
+                "currency": "USD",
+            }
+            for index in range(order_count)
+        ],
+    })
+
+
+def legacy_parse(raw_body: str) -> None:
+    body = json.loads(raw_body)
+    orders = body.get("payment_orders", [])
+    str(sum(Decimal(str(o.get("amount", 0))) for o in orders))
+    payment = initializer.PaymentEvent.model_validate(body)
+    for _ in range(DERIVED_READS):
+        str(sum(Decimal(o.amount) for o in payment.payment_orders))
+        payment.payment_orders[0].currency
+    {o.payment_order_id: o.seller_account for o in payment.payment_orders}
+
+
+def current_parse(raw_body: str) -> None:
+    payment = initializer.PaymentEvent.model_validate_json(raw_body)
+    for _ in range(DERIVED_READS):
+        payment.total_amount
+        payment.currency
+    payment.seller_info
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[1, 10, 500])
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'orders':>8} {'legacy us':>12} {'current us':>12} {'saved us':>10} {'saved %':>8}")
+    for order_count in args.orders:
+        raw_body = build_body(order_count)
+        legacy = bench(lambda: legacy_parse(raw_body))
+        current = bench(lambda: current_parse(raw_body))
+        saved = legacy["median_us"] - current["median_us"]
+        results.append({"orders": order_count, "legacy": legacy, "current": current, "saved_us": saved})
+        print(f"{order_count:>8} {legacy['median_us']:>12.1f} {current['median_us']:>12.1f} "
+              f"{saved:>10.1f} {saved / legacy['median_us'] * 100:>7.1f}%")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"benchmark": "initializer_parsing", "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Measure import and init time of every payment Lambda.
+
+Each Lambda module is imported in a fresh interpreter with ``-X importtime``
+so the numbers match a cold start. The report shows the total init time, the
+time spent building AWS clients on first use and the import time broken down
+by top-level dependency.
+
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --mode eager --json cold_start.json
+
+Modes map to the Lambda settings: ``lazy`` (LAZY_INIT=true, the default) and
+``eager`` (LAZY_INIT=false). Connection priming needs real AWS endpoints and
+is not measured here.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.support import LAMBDAS, SRC_DIR, local_env
+
+PROBE = """
+import importlib.util, json, sys, time
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("lambda_function", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+init_ms = (time.perf_counter() - started) * 1000
+
+from payments_common.lazy import LazyResource
+started = time.perf_counter()
+for value in vars(module).values():
+    if isinstance(value, LazyResource):
+        value.get()
+first_use_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({"init_ms": init_ms, "first_use_ms": first_use_ms}))
+"""
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """Sum the self import time (ms) of every module by top-level package."""
+    by_package: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, module = line[len("import time:"):].split("|")
+        by_package[module.strip().split(".")[0]] += int(self_us) / 1000
+    return dict(by_package)
+
+
+def measure(name: str, mode: str) -> Dict:
+    env = local_env(LAZY_INIT="true" if mode == "lazy" else "false", PRIME_CONNECTIONS="false")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, LAMBDAS[name]],
+        capture_output=True, text=True, env=env, cwd=SRC_DIR, check=True
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["imports_ms"] = parse_importtime(result.stderr)
+    return timings
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    packages = {package for run in runs for package in run["imports_ms"]}
+    return {
+        "init_ms": statistics.median(run["init_ms"] for run in runs),
+        "first_use_ms": statistics.median(run["first_use_ms"] for run in runs),
+        "imports_ms": {
+            package: statistics.median(run["imports_ms"].get(package, 0.0) for run in runs)
+            for package in packages
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold start breakdown of the payment Lambdas")
+    parser.add_argument("--lambdas", nargs="+", choices=sorted(LAMBDAS), default=list(LAMBDAS))
+    parser.add_argument("--mode", choices=["lazy", "eager"], default="lazy")
+    parser.add_argument("--runs", type=int, default=3, help="interpreters started per Lambda, the median is reported")
+    parser.add_argument("--top", type=int, default=8, help="dependencies shown per Lambda")
+    parser.add_argument("--json", help="write the full report to this file")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.lambdas:
+        report[name] = summarize([measure(name, args.mode) for _ in range(args.runs)])
+        summary = report[name]
+        print(f"=== lambda-payments-{name} ({args.mode}) ===")
+        print(f"  init:          {summary['init_ms']:8.1f} ms")
+        print(f"  client build:  {summary['first_use_ms']:8.1f} ms (on first use)")
+        print("  imports by dependency:")
+        ranked = sorted(summary["imports_ms"].items(), key=lambda item: item[1], reverse=True)
+        for package, duration in ranked[:args.top]:
+            print(f"    {package:<28}{duration:8.1f} ms")
+        print()
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"mode": args.mode, "runs": args.runs, "lambdas": report}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Microbenchmarks of the Lambdas' hot functions, as a baseline for changes.
+
+Cases (median microseconds per call, from benchmarks.support.bench):
+
+- initializer: PaymentEvent.model_validate and format_validation_errors on
+  checkouts of 1 to 1,000 orders, build_response for 202 and 400 bodies
+- every log_business_event call site of the initializer, executor and
+  wallet, logging to a null stream
+- ExecutionMessage and PaymentResultMessage parsing of SQS bodies
+- settlement against the in-memory DynamoDB stand-in, reseeded before
+  every call: settle_wallets, the wallet handler for schema 1 and 2
+  SUCCESS results, stream_payment_result and FAILED results
+
+    python -m benchmarks.hot_paths --json baseline.json
+    python -m benchmarks.hot_paths --compare baseline.json --json current.json
+
+--compare prints the change against a previous run and exits non-zero when
+a case got slower than --threshold percent.
+"""
+import argparse
+import json
+import platform
+import re
+import sys
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.local_aws import LocalDynamoDB
+from benchmarks.support import LocalContext, bench, load_lambda
+
+ORDER_COUNTS = [1, 10, 100, 1000]
+
+initializer = load_lambda("initializer")
+executor = load_lambda("executor")
+wallet = load_lambda("wallet")
+
+
+class NullStream:
+    """Log sink that keeps the formatting cost but drops the output."""
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+# LOCAL_ENV sets POWERTOOLS_LOG_LEVEL=ERROR; business events are logged at INFO
+for module in (initializer, executor, wallet):
+    module.logger.setLevel("INFO")
+    module.logger.registered_handler.setStream(NullStream())
+
+
+def build_orders(order_count: int, amount: str = "42") -> List[Dict[str, str]]:
+    return [
+        {
+            "payment_order_id": f"po-{index}",
+            "seller_account": f"seller-acct-{index % 10:03d}",
+            "amount": amount,
+            "currency": "USD",
+        }
+        for index in range(order_count)
+    ]
+
+
+def build_checkout(order_count: int, amount: str = "42") -> Dict[str, Any]:
+    return {
+        "checkout_id": "chk-benchmark",
+        "buyer_info": {"user_id": "buyer-1", "email": "buyer@example.com"},
+        "credit_card_info": {"payment_token": "tok_benchmark"},
+        "payment_orders": build_orders(order_count, amount),
+    }
+
+
+def validation_errors(order_count: int) -> list:
+    try:
+        initializer.PaymentEvent.model_validate(build_checkout(order_count, amount="not-a-number"))
+    except initializer.ValidationError as err:
+        return err.errors()
+    raise AssertionError("payload unexpectedly valid")
+
+
+def initializer_cases() -> Dict[str, Callable[[], Any]]:
+    cases = {}
+    for order_count in ORDER_COUNTS:
+        checkout = build_checkout(order_count)
+        errors = validation_errors(order_count)
+        cases[f"initializer.PaymentEvent.model_validate[{order_count}]"] = (
+            lambda checkout=checkout: initializer.PaymentEvent.model_validate(checkout))
+        cases[f"initializer.format_validation_errors[{order_count}]"] = (
+            lambda errors=errors: initializer.format_validation_errors(errors))
+
+    accepted = {"checkout_id": "chk-benchmark", "status": "ACCEPTED", "message": "Payment accepted for processing"}
+    rejected = {"error": "Validation failed", "details": initializer.format_validation_errors(validation_errors(10))}
+    cases["initializer.build_response[202]"] = lambda: initializer.build_response(
+        202, accepted, {"Server-Timing": "persist;dur=12.3, enqueue;dur=4.5"})
+    cases["initializer.build_response[400x10]"] = lambda: initializer.build_response(400, rejected)
+    return cases
+
+
+# (module, msg, event_type, outcome, stage, data) for every log_business_event call site
+BUSINESS_EVENTS: Dict[str, Tuple[Any, str, str, str, str, Dict[str, Any]]] = {
+    "initializer.request.received": (initializer, "Payment request received", "payment.request.received",
+                                     "RECEIVED", "REQUEST",
+                                     {"amount.total": "126", "amount.currency": "USD", "order.count": 3}),
+    "initializer.checkout.rejected": (initializer, "Payment validation failed", "payment.checkout.rejected",
+                                      "REJECTED", "VALIDATION",
+                                      {"error.code": "VALIDATION_ERROR", "error.message": "[{'field': 'payment_orders.0.amount'}]",
+                                       "order.count": 3}),
+    "initializer.checkout.initiated": (initializer, "Payment checkout initiated", "payment.checkout.initiated",
+                                       "VALIDATED", "INITIALIZATION",
+                                       {"amount.total": "126", "amount.currency": "USD", "order.count": 3}),
+    "initializer.checkout.queued": (initializer, "Payment sent to execution queue", "payment.checkout.queued",
+                                    "QUEUED", "INITIALIZATION",
+                                    {"amount.total": "126", "amount.currency": "USD", "order.count": 3,
+                                     "persistence.mode": "transact", "timing.persist.ms": 12.3, "timing.enqueue.ms": 4.5}),
+    "executor.psp.response": (executor, "PSP response received", "payment.psp.response", "SUCCESS", "PSP_INTEGRATION",
+                              {"amount.total": "126", "amount.currency": "USD", "psp.response.status": "SUCCESS",
+                               "psp.response.error_code": None, "psp.latency.ms": 231}),
+    "executor.psp.server_error": (executor, "PSP server error", "payment.psp.response", "FAILURE", "PSP_INTEGRATION",
+                                  {"amount.total": "126", "amount.currency": "USD", "psp.response.status": "FAILED",
+                                   "psp.response.error_code": "PSP_SERVER_ERROR", "psp.latency.ms": 231,
+                                   "error.category": "PSP"}),
+    "executor.psp.connection_error": (executor, "PSP connection error", "payment.psp.response", "FAILURE",
+                                      "PSP_INTEGRATION",
+                                      {"amount.total": "126", "amount.currency": "USD", "psp.response.status": "FAILED",
+                                       "psp.response.error_code": "CONNECTION_ERROR", "psp.latency.ms": 3050,
+                                       "error.category": "PSP"}),
+    "executor.wallet.queued": (executor, "Payment sent to wallet queue", "payment.wallet.queued", "SUCCESS", "EXECUTION",
+                               {"amount.total": "126", "amount.currency": "USD", "payment.status": "SUCCESS",
+                                "error.code": None}),
+    "wallet.order.failed": (wallet, "Payment order failed", "payment.order.failed", "FAILURE", "SETTLEMENT",
+                            {"payment_order.id": "po-1", "amount.total": "42", "amount.currency": "USD",
+                             "merchant.id": "seller-acct-001", "error.code": "CARD_DECLINED", "error.category": "PSP"}),
+    "wallet.order.settled": (wallet, "Payment order settled", "payment.order.settled", "SUCCESS", "SETTLEMENT",
+                             {"payment_order.id": "po-1", "amount.total": "42", "amount.currency": "USD",
+                              "merchant.id": "seller-acct-001"}),
+    "wallet.checkout.settled": (wallet, "Payment checkout settled", "payment.checkout.settled", "SUCCESS", "SETTLEMENT",
+                                {"amount.total": Decimal("126"), "amount.currency": "USD", "order.count": 3}),
+}
+
+
+def business_event_cases() -> Dict[str, Callable[[], Any]]:
+    def emit(module, msg, event_type, outcome, stage, data):
+        module.business_events.emit(msg=msg, event_type=event_type, checkout_id="chk-benchmark", outcome=outcome,
+                                    stage=stage, data=data)
+
+    cases = {}
+    for name, (module, msg, event_type, outcome, stage, data) in BUSINESS_EVENTS.items():
+        cases[f"log_business_event.{name}"] = lambda args=(module, msg, event_type, outcome, stage, data): emit(*args)
+    return cases
+
+
+def message_cases() -> Dict[str, Callable[[], Any]]:
+    cases = {}
+    for order_count in ORDER_COUNTS:
+        orders = build_orders(order_count)
+        execution_body = json.dumps({
+            "checkout_id": "chk-benchmark", "total_amount": str(42 * order_count), "currency": "USD",
+            "credit_card_info": {"payment_token": "tok_benchmark"}, "simulate": {},
+            "schema_version": 2, "orders": orders,
+        })
+        result_body = json.dumps({
+            "checkout_id": "chk-benchmark", "status": "SUCCESS", "error_code": None, "simulate": {},
+            "schema_version": 2, "orders": orders,
+        })
+        cases[f"executor.ExecutionMessage.parse[{order_count}]"] = (
+            lambda body=execution_body: executor.ExecutionMessage.model_validate_json(body))
+        cases[f"wallet.PaymentResultMessage.parse[{order_count}]"] = (
+            lambda body=result_body: wallet.PaymentResultMessage.model_validate_json(body))
+    return cases
+
+
+def settlement_cases() -> Dict[str, Any]:
+    """Settlement cases, each run against freshly seeded tables: (func, setup) pairs."""
+    dynamodb = LocalDynamoDB()
+    wallet.dynamodb._instance = dynamodb
+    for resource in (wallet.payment_event_table, wallet.payment_order_table, wallet.dynamodb_client):
+        resource._instance = None
+
+    def seed(checkout_id: str, orders: List[Dict[str, str]]) -> None:
+        for table in (wallet.PAYMENT_EVENT_TABLE, wallet.PAYMENT_ORDER_TABLE, wallet.WALLET_TABLE):
+            dynamodb.tables[table].clear()
+        for order in orders:
+            wallet.payment_order_table.put_item(Item={
+                "payment_order_id": order["payment_order_id"],
+                "checkout_id": checkout_id,
+                "amount": order["amount"],
+                "currency": order["currency"],
+                "payment_order_status": "EXECUTING",
+            })
+        # the schema 1 lookup maps the stored payment_order_id to a seller
+        wallet.payment_event_table.put_item(Item={
+            "checkout_id": checkout_id,
+            "is_payment_done": False,
+            "seller_info": {order["payment_order_id"]: order["seller_account"] for order in orders},
+        })
+
+    def record(message: Any) -> Dict[str, Any]:
+        return {"messageId": message.checkout_id, "body": message.model_dump_json(), "attributes": {},
+                "messageAttributes": {}, "eventSource": "aws:sqs"}
+
+    cases = {}
+    for order_count in [1, 10, 100]:
+        checkout_id = f"chk-settle-{order_count}"
+        orders = [{**order, "payment_order_id": f"{checkout_id}-{order['payment_order_id']}"}
+                  for order in build_orders(order_count)]
+        setup = lambda checkout_id=checkout_id, orders=orders: seed(checkout_id, orders)
+
+        schema_1 = wallet.PaymentResultMessage(checkout_id=checkout_id, status="SUCCESS")
+        schema_2 = wallet.PaymentResultMessage(checkout_id=checkout_id, status="SUCCESS", schema_version=2, orders=orders)
+        failed = wallet.PaymentResultMessage(checkout_id=checkout_id, status="FAILED", error_code="CARD_DECLINED",
+                                             schema_version=2, orders=orders)
+        processed = [("success", {"checkout_id": checkout_id, "status": "SUCCESS", "processed_orders": order_count,
+                                  "orders": orders}, record(schema_2))]
+        cases[f"wallet.settle_wallets[{order_count}]"] = (
+            lambda processed=processed: wallet.settle_wallets(processed), setup)
+        # prefetch, lookups and settlement of a whole invocation
+        cases[f"wallet.handler.success_schema_1[{order_count}]"] = (
+            lambda event={"Records": [record(schema_1)]}: wallet.handler(event, LocalContext("wallet")), setup)
+        cases[f"wallet.handler.success_schema_2[{order_count}]"] = (
+            lambda event={"Records": [record(schema_2)]}: wallet.handler(event, LocalContext("wallet")), setup)
+        # not prefetched: read and settled page by page
+        cases[f"wallet.stream_payment_result[{order_count}]"] = (
+            lambda message=schema_1: wallet.stream_payment_result(message, wallet.BatchLookups()), setup)
+        cases[f"wallet.process_payment_result.failed[{order_count}]"] = (
+            lambda message=failed: wallet.process_payment_result(message), setup)
+    return cases
+
+
+SUITES = {
+    "initializer": initializer_cases,
+    "business_events": business_event_cases,
+    "messages": message_cases,
+    "settlement": settlement_cases,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="only run cases whose name matches this regex")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous --json output to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="slowdown in %% reported as a regression")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as previous:
+            baseline = {case["name"]: case for case in json.load(previous)["results"]}
+
+    results = []
+    regressions = []
+    print(f"{'case':<66} {'median us':>11} {'baseline':>11} {'change':>8}")
+    for suite, build_cases in SUITES.items():
+        for name, case in build_cases().items():
+            if args.filter and not re.search(args.filter, name):
+                continue
+            func, setup = case if isinstance(case, tuple) else (case, None)
+            timing = bench(func, repeat=args.repeat, setup=setup)
+            results.append({"suite": suite, "name": name, **timing})
+
+            line = f"{name:<66} {timing['median_us']:>11.2f}"
+            if name in baseline:
+                change = (timing["median_us"] / baseline[name]["median_us"] - 1) * 100
+                line += f" {baseline[name]['median_us']:>11.2f} {change:>+7.1f}%"
+                if change > args.threshold:
+                    regressions.append(name)
+            print(line)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({
+                "benchmark": "hot_paths",
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, output, indent=2)
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than {args.threshold:g}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""In-memory stand-ins for the DynamoDB and SQS calls made by the Lambdas.
+
+They implement only what the handlers use, with boto3's high-level value
+types (Decimal numbers, floats rejected): get/put/update_item, query on a
+table or GSI with Limit/ExclusiveStartKey, batch_get_item, batch_write_item,
+transact_write_items and the small expression subset the code relies on
+(SET/ADD updates, attribute_exists/attribute_not_exists and =/<> conditions
+joined by AND). An optional per-call latency approximates the network
+round trip.
+"""
+import copy
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+# table name -> hash key
+TABLE_KEYS = {
+    "PaymentEvent": "checkout_id",
+    "PaymentOrder": "payment_order_id",
+    "Wallet": "merchant_id",
+    "PaymentIdempotency": "checkout_id",
+}
+
+
+def to_dynamo(value: Any) -> Any:
+    """Convert a value the way boto3's TypeSerializer accepts it."""
+    if isinstance(value, bool) or value is None or isinstance(value, (str, Decimal, bytes)):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if isinstance(value, dict):
+        return {key: to_dynamo(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(item) for item in value]
+    if isinstance(value, set):
+        return {to_dynamo(item) for item in value}
+    raise TypeError(f"Unsupported type {type(value).__name__}")
+
+
+serializer = TypeSerializer()
+
+
+def client_error(code: str, operation: str, message: str = "", **extra: Any) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message or code}, **extra}, operation)
+
+
+class LocalDynamoDB:
+    """Thread-safe in-memory DynamoDB usable as boto3 resource and meta.client."""
+
+    def __init__(self, latency_ms: float = 0.0, table_keys: Optional[Dict[str, str]] = None):
+        self.latency_ms = latency_ms
+        self.table_keys = {**TABLE_KEYS, **(table_keys or {})}
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {name: {} for name in self.table_keys}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    # resource-style access used by the Lambdas: dynamodb.meta.client and dynamodb.Table(name)
+    @property
+    def meta(self) -> "LocalDynamoDB":
+        return self
+
+    @property
+    def client(self) -> "LocalDynamoDB":
+        return self
+
+    def Table(self, name: str) -> "LocalTable":
+        return LocalTable(self, name)
+
+    def _call(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _key(self, table_name: str, key: Dict[str, Any]) -> str:
+        return key[self.table_keys[table_name]]
+
+    # expressions
+
+    @staticmethod
+    def _check_condition(item: Optional[Dict[str, Any]], expression: Optional[str], values: Dict[str, Any]) -> bool:
+        if not expression:
+            return True
+        current = item or {}
+        for clause in re.split(r"\s+AND\s+", expression.strip()):
+            clause = clause.strip()
+            if match := re.fullmatch(r"attribute_exists\((\w+)\)", clause):
+                ok = match.group(1) in current
+            elif match := re.fullmatch(r"attribute_not_exists\((\w+)\)", clause):
+                ok = match.group(1) not in current
+            elif match := re.fullmatch(r"(\w+)\s*(<>|=)\s*(:\w+)", clause):
+                name, operator, placeholder = match.groups()
+                equal = name in current and current[name] == values[placeholder]
+                ok = equal if operator == "=" else not equal
+            else:
+                raise NotImplementedError(f"Unsupported condition: {clause}")
+            if not ok:
+                return False
+        return True
+
+    @staticmethod
+    def _apply_update(item: Dict[str, Any], expression: str, values: Dict[str, Any]) -> None:
+        for action, body in re.findall(r"(SET|ADD)\s+(.*?)(?=\s+(?:SET|ADD)\s+|$)", expression.strip()):
+            for assignment in (part.strip() for part in body.split(",")):
+                if action == "SET":
+                    name, placeholder = (side.strip() for side in assignment.split("="))
+                    item[name] = copy.deepcopy(values[placeholder])
+                else:
+                    name, placeholder = assignment.split()
+                    item[name] = item.get(name, Decimal("0")) + values[placeholder]
+
+    # item operations
+
+    def get_item(self, TableName: str, Key: Dict[str, Any], ConsistentRead: bool = False, **kwargs) -> Dict[str, Any]:
+        self._call("GetItem")
+        with self._lock:
+            item = self.tables[TableName].get(self._key(TableName, Key))
+            return {"Item": copy.deepcopy(item)} if item is not None else {}
+
+    def put_item(self, TableName: str, Item: Dict[str, Any], ConditionExpression: Optional[str] = None,
+                 ExpressionAttributeValues: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        self._call("PutItem")
+        item = to_dynamo(Item)
+        with self._lock:
+            key = self._key(TableName, item)
+            if not self._check_condition(self.tables[TableName].get(key), ConditionExpression, ExpressionAttributeValues or {}):
+                raise client_error("ConditionalCheckFailedException", "PutItem")
+            self.tables[TableName][key] = item
+        return {}
+
+    def update_item(self, TableName: str, Key: Dict[str, Any], UpdateExpression: str,
+                    ExpressionAttributeValues: Optional[Dict[str, Any]] = None, ConditionExpression: Optional[str] = None,
+                    **kwargs) -> Dict[str, Any]:
+        self._call("UpdateItem")
+        values = to_dynamo(ExpressionAttributeValues or {})
+        with self._lock:
+            key = self._key(TableName, Key)
+            current = self.tables[TableName].get(key)
+            if not self._check_condition(current, ConditionExpression, values):
+                raise client_error("ConditionalCheckFailedException", "UpdateItem")
+            item = copy.deepcopy(current) if current is not None else to_dynamo(dict(Key))
+            self._apply_update(item, UpdateExpression, values)
+            self.tables[TableName][key] = item
+        return {}
+
+    def query(self, TableName: str, KeyConditionExpression: str, ExpressionAttributeValues: Dict[str, Any],
+              IndexName: Optional[str] = None, Limit: Optional[int] = None,
+              ExclusiveStartKey: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        self._call("Query")
+        match = re.fullmatch(r"\s*(\w+)\s*=\s*(:\w+)\s*", KeyConditionExpression)
+        if not match:
+            raise NotImplementedError(f"Unsupported key condition: {KeyConditionExpression}")
+        attribute, placeholder = match.groups()
+        table_key = self.table_keys[TableName]
+        with self._lock:
+            items = sorted(
+                (item for item in self.tables[TableName].values() if item.get(attribute) == ExpressionAttributeValues[placeholder]),
+                key=lambda item: item[table_key]
+            )
+        if ExclusiveStartKey:
+            items = [item for item in items if item[table_key] > ExclusiveStartKey[table_key]]
+        response: Dict[str, Any] = {}
+        if Limit is not None and len(items) > Limit:
+            items = items[:Limit]
+            last = items[-1]
+            response["LastEvaluatedKey"] = {table_key: last[table_key], **({attribute: last[attribute]} if IndexName else {})}
+        response["Items"] = copy.deepcopy(items)
+        response["Count"] = len(items)
+        return response
+
+    def scan(self, TableName: str, **kwargs) -> Dict[str, Any]:
+        self._call("Scan")
+        with self._lock:
+            items = copy.deepcopy(list(self.tables[TableName].values()))
+        return {"Items": items, "Count": len(items)}
+
+    # batch and transaction operations
+
+    def batch_get_item(self, RequestItems: Dict[str, Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        self._call("BatchGetItem")
+        if sum(len(request["Keys"]) for request in RequestItems.values()) > 100:
+            raise client_error("ValidationException", "BatchGetItem", "Too many items requested for the BatchGetItem call")
+        responses: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for table_name, request in RequestItems.items():
+                table = self.tables[table_name]
+                keys = (self._key(table_name, key) for key in request["Keys"])
+                responses[table_name] = [copy.deepcopy(table[key]) for key in keys if key in table]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]], **kwargs) -> Dict[str, Any]:
+        self._call("BatchWriteItem")
+        if sum(len(requests) for requests in RequestItems.values()) > 25:
+            raise client_error("ValidationException", "BatchWriteItem", "Too many items requested for the BatchWriteItem call")
+        with self._lock:
+            for table_name, requests in RequestItems.items():
+                for request in requests:
+                    if "PutRequest" in request:
+                        item = to_dynamo(request["PutRequest"]["Item"])
+                        self.tables[table_name][self._key(table_name, item)] = item
+                    else:
+                        self.tables[table_name].pop(self._key(table_name, request["DeleteRequest"]["Key"]), None)
+        return {"UnprocessedItems": {}}
+
+    def transact_write_items(self, TransactItems: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        self._call("TransactWriteItems")
+        if len(TransactItems) > 100:
+            raise client_error("ValidationException", "TransactWriteItems", "Member must have length less than or equal to 100")
+
+        with self._lock:
+            targets: List[Tuple[str, str]] = []
+            reasons = []
+            for transact_item in TransactItems:
+                (operation, request), = transact_item.items()
+                table_name = request["TableName"]
+                key = self._key(table_name, request["Key"] if "Key" in request else request["Item"])
+                targets.append((table_name, key))
+                values = to_dynamo(request.get("ExpressionAttributeValues", {}))
+                current = self.tables[table_name].get(key)
+                ok = self._check_condition(current, request.get("ConditionExpression"), values)
+                reason = {"Code": "None"} if ok else {"Code": "ConditionalCheckFailed", "Message": "The conditional request failed"}
+                if not ok and current is not None and request.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD":
+                    # error responses are not deserialized by the resource layer, the item stays in wire format
+                    reason["Item"] = {name: serializer.serialize(value) for name, value in current.items()}
+                reasons.append(reason)
+
+            if len(set(targets)) != len(targets):
+                raise client_error("ValidationException", "TransactWriteItems",
+                                   "Transaction request cannot include multiple operations on one item")
+            if any(reason["Code"] != "None" for reason in reasons):
+                raise client_error("TransactionCanceledException", "TransactWriteItems",
+                                   "Transaction cancelled", CancellationReasons=reasons)
+
+            for transact_item, (table_name, key) in zip(TransactItems, targets):
+                (operation, request), = transact_item.items()
+                if operation == "Put":
+                    self.tables[table_name][key] = to_dynamo(request["Item"])
+                elif operation == "Update":
+                    item = copy.deepcopy(self.tables[table_name].get(key)) or to_dynamo(dict(request["Key"]))
+                    self._apply_update(item, request["UpdateExpression"], to_dynamo(request.get("ExpressionAttributeValues", {})))
+                    self.tables[table_name][key] = item
+                elif operation == "Delete":
+                    self.tables[table_name].pop(key, None)
+        return {}
+
+    def describe_table(self, TableName: str, **kwargs) -> Dict[str, Any]:
+        self._call("DescribeTable")
+        return {"Table": {"TableName": TableName, "TableStatus": "ACTIVE"}}
+
+
+class LocalTable:
+    """boto3 Table resource over a LocalDynamoDB table."""
+
+    def __init__(self, database: LocalDynamoDB, name: str):
+        self.database = database
+        self.name = name
+
+    def get_item(self, **kwargs) -> Dict[str, Any]:
+        return self.database.get_item(TableName=self.name, **kwargs)
+
+    def put_item(self, **kwargs) -> Dict[str, Any]:
+        return self.database.put_item(TableName=self.name, **kwargs)
+
+    def update_item(self, **kwargs) -> Dict[str, Any]:
+        return self.database.update_item(TableName=self.name, **kwargs)
+
+    def query(self, **kwargs) -> Dict[str, Any]:
+        return self.database.query(TableName=self.name, **kwargs)
+
+    def batch_writer(self) -> "LocalBatchWriter":
+        return LocalBatchWriter(self)
+
+
+class LocalBatchWriter:
+    def __init__(self, table: LocalTable):
+        self.table = table
+        self.pending: List[Dict[str, Any]] = []
+
+    def put_item(self, Item: Dict[str, Any]) -> None:
+        self.pending.append({"PutRequest": {"Item": Item}})
+        if len(self.pending) == 25:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.pending:
+            self.table.database.batch_write_item(RequestItems={self.table.name: self.pending})
+            self.pending = []
+
+    def __enter__(self) -> "LocalBatchWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._flush()
+
+
+class LocalSqs:
+    """In-memory SQS queues keyed by queue URL, with receive counts and sent timestamps."""
+
+    def __init__(self, latency_ms: float = 0.0, region: str = "eu-west-1"):
+        self.latency_ms = latency_ms
+        self.region = region
+        self.queues: Dict[str, deque] = {}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _call(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _enqueue(self, queue_url: str, body: str, receive_count: int = 0, message_id: Optional[str] = None) -> str:
+        message = {"messageId": message_id or str(uuid.uuid4()), "body": body, "sent_at": time.time(), "receive_count": receive_count}
+        with self._lock:
+            self.queues.setdefault(queue_url, deque()).append(message)
+        return message["messageId"]
+
+    def send_message(self, QueueUrl: str, MessageBody: str, **kwargs) -> Dict[str, Any]:
+        self._call("SendMessage")
+        return {"MessageId": self._enqueue(QueueUrl, MessageBody)}
+
+    def send_message_batch(self, QueueUrl: str, Entries: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        self._call("SendMessageBatch")
+        if len(Entries) > 10:
+            raise client_error("AWS.SimpleQueueService.TooManyEntriesInBatchRequest", "SendMessageBatch")
+        successful = [{"Id": entry["Id"], "MessageId": self._enqueue(QueueUrl, entry["MessageBody"])} for entry in Entries]
+        return {"Successful": successful, "Failed": []}
+
+    def get_queue_attributes(self, QueueUrl: str, **kwargs) -> Dict[str, Any]:
+        self._call("GetQueueAttributes")
+        return {"Attributes": {"QueueArn": self.queue_arn(QueueUrl)}}
+
+    def queue_arn(self, queue_url: str) -> str:
+        return f"arn:aws:sqs:{self.region}:000000000000:{queue_url.rsplit('/', 1)[-1]}"
+
+    def depth(self, queue_url: str) -> int:
+        with self._lock:
+            return len(self.queues.get(queue_url, ()))
+
+    def receive_records(self, queue_url: str, max_messages: int = 10) -> List[Dict[str, Any]]:
+        """Pop up to max_messages as Lambda SQS event records."""
+        with self._lock:
+            queue = self.queues.setdefault(queue_url, deque())
+            messages = [queue.popleft() for _ in range(min(max_messages, len(queue)))]
+        records = []
+        for message in messages:
+            message["receive_count"] += 1
+            records.append({
+                "messageId": message["messageId"],
+                "receiptHandle": message["messageId"],
+                "body": message["body"],
+                "attributes": {
+                    "ApproximateReceiveCount": str(message["receive_count"]),
+                    "SentTimestamp": f"{message['sent_at'] * 1000:.3f}",
+                    "ApproximateFirstReceiveTimestamp": str(int(time.time() * 1000)),
+                },
+                "messageAttributes": {},
+                "md5OfBody": "",
+                "eventSource": "aws:sqs",
+                "eventSourceARN": self.queue_arn(queue_url),
+                "awsRegion": self.region,
+            })
+        return records
+
+    def redeliver(self, queue_url: str, record: Dict[str, Any]) -> None:
+        """Put a failed record back, as SQS does once its visibility timeout expires."""
+        attributes = record["attributes"]
+        self._enqueue(queue_url, record["body"], receive_count=int(attributes["ApproximateReceiveCount"]), message_id=record["messageId"])
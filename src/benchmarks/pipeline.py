@@ -0,0 +1,318 @@
+"""Offline end-to-end run of initializer -> SQS -> executor -> PSP -> SQS -> wallet.
+
+The four handlers are imported in-process and wired together through the
+in-memory SQS and DynamoDB stand-ins from benchmarks.local_aws; no AWS
+account is needed. The PSP is called in-process through a requests
+transport adapter, or over HTTP with --psp http (benchmarks.psp_server on
+an ephemeral port). Executor and wallet pollers drain their queues in
+batches of 10 while the checkouts are being submitted, like the SQS event
+source mappings do, and failed batch items are redelivered up to
+--max-receives times.
+
+    python -m benchmarks.pipeline --checkouts 500 --clients 8 --json pipeline.json
+
+Reported: throughput, end-to-end latency per checkout, handler latency per
+stage and the time messages wait in each queue.
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import queue
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from uuid import uuid4
+
+import requests
+from requests.adapters import BaseAdapter
+
+from benchmarks.local_aws import LocalDynamoDB, LocalSqs
+from benchmarks.support import LOCAL_ENV, LocalContext, load_lambda
+
+EXECUTION_QUEUE_URL = "https://sqs.eu-west-1.amazonaws.com/000000000000/payment-execution-queue"
+RESULTS_QUEUE_URL = "https://sqs.eu-west-1.amazonaws.com/000000000000/payment-results-queue"
+SELLER_ACCOUNTS = [f"seller-acct-{index:03d}" for index in range(1, 11)]
+
+
+class InProcessPspAdapter(BaseAdapter):
+    """requests transport that hands the request to the PSP handler directly."""
+
+    def __init__(self, psp_module):
+        super().__init__()
+        self.psp = psp_module
+
+    def send(self, request, **kwargs):
+        body = request.body.decode() if isinstance(request.body, bytes) else request.body
+        result = self.psp.handler({"body": body, "httpMethod": "POST", "path": "/process"}, LocalContext("psp"))
+        response = requests.Response()
+        response.status_code = result["statusCode"]
+        response.headers.update(result.get("headers", {}))
+        response._content = result["body"].encode()
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class StageTimings:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, value_ms: float) -> None:
+        with self._lock:
+            self.samples.setdefault(stage, []).append(value_ms)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        def percentile(values: List[float], pct: float) -> float:
+            return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+        result = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            result[stage] = {
+                "count": len(ordered),
+                "mean_ms": statistics.fmean(ordered),
+                "p50_ms": percentile(ordered, 50),
+                "p90_ms": percentile(ordered, 90),
+                "p99_ms": percentile(ordered, 99),
+                "max_ms": ordered[-1],
+            }
+        return result
+
+
+def build_checkout(order_count: int) -> Dict[str, Any]:
+    return {
+        "checkout_id": f"chk-{uuid4().hex[:12]}",
+        "buyer_info": {"user_id": f"buyer-{uuid4().hex[:8]}", "email": "buyer@example.com"},
+        "credit_card_info": {"payment_token": f"tok_{uuid4().hex[:12]}"},
+        "payment_orders": [
+            {
+                "payment_order_id": f"po-{uuid4().hex[:12]}",
+                "seller_account": SELLER_ACCOUNTS[index % len(SELLER_ACCOUNTS)],
+                "amount": "42",
+                "currency": "USD",
+            }
+            for index in range(order_count)
+        ],
+    }
+
+
+class Pipeline:
+    def __init__(self, psp_mode: str, dynamodb_latency_ms: float, sqs_latency_ms: float, max_receives: int):
+        os.environ.update({
+            "PAYMENT_EXECUTION_QUEUE_URL": EXECUTION_QUEUE_URL,
+            "PAYMENT_RESULTS_QUEUE_URL": RESULTS_QUEUE_URL,
+            "IDEMPOTENCY_TABLE": "PaymentIdempotency",
+            "PSP_URL": os.environ.get("PSP_URL", "http://psp.local"),
+        })
+        for key, value in LOCAL_ENV.items():
+            os.environ.setdefault(key, value)
+        self.dynamodb = LocalDynamoDB(latency_ms=dynamodb_latency_ms)
+        self.sqs = LocalSqs(latency_ms=sqs_latency_ms)
+        self.max_receives = max_receives
+        self.timings = StageTimings()
+        self.submitted_at: Dict[str, float] = {}
+        self.completed: Dict[str, str] = {}
+        self.dead_letters = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self.psp = None
+
+        if psp_mode == "http":
+            from benchmarks.psp_server import serve
+
+            self._server = serve(port=0)
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        else:
+            self.psp = load_lambda("psp")
+
+    def container(self, name: str):
+        """Load a fresh copy of a Lambda module wired to the local stand-ins.
+
+        Every copy plays one warm execution environment: concurrent
+        invocations never share module state, as on Lambda.
+        """
+        module = load_lambda(name)
+        # drop anything built at import (LAZY_INIT=false) before pointing the module at the stand-ins
+        for resource in ("dynamodb_client", "payment_event_table", "payment_order_table"):
+            if hasattr(module, resource):
+                getattr(module, resource)._instance = None
+        if hasattr(module, "dynamodb"):
+            module.dynamodb._instance = self.dynamodb
+        if hasattr(module, "sqs"):
+            module.sqs._instance = self.sqs
+
+        if name == "executor":
+            module.dynamodb_client._instance = self.dynamodb
+            if self._server:
+                module.psp_client.base_url = f"http://127.0.0.1:{self._server.server_port}"
+            else:
+                module.psp_client.session.mount(module.psp_client.base_url, InProcessPspAdapter(self.psp))
+        return module
+
+    def close(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def submit(self, initializers: queue.Queue, checkout: Dict[str, Any]) -> None:
+        initializer = initializers.get()
+        with self._lock:
+            self.submitted_at[checkout["checkout_id"]] = time.time()
+        started = time.perf_counter()
+        try:
+            response = initializer.handler({"body": json.dumps(checkout)}, LocalContext("initializer"))
+        finally:
+            initializers.put(initializer)
+        self.timings.add("initializer.handler", (time.perf_counter() - started) * 1000)
+        if response["statusCode"] != 202:
+            with self._lock:
+                self.completed[checkout["checkout_id"]] = f"HTTP {response['statusCode']}"
+
+    def _deliver(self, queue_url: str, handler, stage: str) -> List[Dict[str, Any]]:
+        """Run one batch through a handler; returns the records it processed."""
+        records = self.sqs.receive_records(queue_url)
+        if not records:
+            return []
+        received_at_ms = time.time() * 1000
+        for record in records:
+            self.timings.add(f"{stage}.queue_dwell", received_at_ms - float(record["attributes"]["SentTimestamp"]))
+
+        started = time.perf_counter()
+        try:
+            response = handler({"Records": records}, LocalContext(stage))
+        except Exception:
+            # a failed invocation (e.g. BatchProcessingError when every record failed) returns the whole batch
+            response = {"batchItemFailures": [{"itemIdentifier": record["messageId"]} for record in records]}
+        self.timings.add(f"{stage}.handler", (time.perf_counter() - started) * 1000)
+
+        failed = {failure["itemIdentifier"] for failure in (response or {}).get("batchItemFailures", [])}
+        delivered = []
+        for record in records:
+            if record["messageId"] not in failed:
+                delivered.append(record)
+            elif int(record["attributes"]["ApproximateReceiveCount"]) < self.max_receives:
+                self.sqs.redeliver(queue_url, record)
+            else:
+                with self._lock:
+                    self.dead_letters += 1
+                    self.completed[json.loads(record["body"])["checkout_id"]] = f"DLQ {stage}"
+        return delivered
+
+    def poll_executor(self, executor, stop: threading.Event) -> None:
+        while not stop.is_set():
+            if not self._deliver(EXECUTION_QUEUE_URL, executor.handler, "executor"):
+                time.sleep(0.001)
+
+    def poll_wallet(self, wallet, stop: threading.Event) -> None:
+        while not stop.is_set():
+            delivered = self._deliver(RESULTS_QUEUE_URL, wallet.handler, "wallet")
+            finished_at = time.time()
+            for record in delivered:
+                message = json.loads(record["body"])
+                with self._lock:
+                    self.completed[message["checkout_id"]] = message["status"]
+                    self.timings.add("end_to_end", (finished_at - self.submitted_at[message["checkout_id"]]) * 1000)
+            if not delivered:
+                time.sleep(0.001)
+
+    def run(self, checkouts: int, orders: int, clients: int, executor_pollers: int, wallet_pollers: int,
+            timeout: float) -> Dict[str, Any]:
+        payloads = [build_checkout(orders) for _ in range(checkouts)]
+        # build every container up front so module imports stay out of the measured window
+        initializers: queue.Queue = queue.Queue()
+        for _ in range(clients):
+            initializers.put(self.container("initializer"))
+        stop = threading.Event()
+        pollers = [
+            threading.Thread(target=self.poll_executor, args=(self.container("executor"), stop), daemon=True)
+            for _ in range(executor_pollers)
+        ] + [
+            threading.Thread(target=self.poll_wallet, args=(self.container("wallet"), stop), daemon=True)
+            for _ in range(wallet_pollers)
+        ]
+
+        started = time.perf_counter()
+        for poller in pollers:
+            poller.start()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(functools.partial(self.submit, initializers), payloads))
+        submitted = time.perf_counter() - started
+
+        deadline = time.monotonic() + timeout
+        while len(self.completed) < checkouts and time.monotonic() < deadline:
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for poller in pollers:
+            poller.join()
+
+        outcomes: Dict[str, int] = {}
+        for outcome in self.completed.values():
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        return {
+            "checkouts": checkouts,
+            "orders_per_checkout": orders,
+            "completed": len(self.completed),
+            "outcomes": outcomes,
+            "dead_letters": self.dead_letters,
+            "submit_seconds": submitted,
+            "elapsed_seconds": elapsed,
+            "throughput_per_second": len(self.completed) / elapsed,
+            "stages": self.timings.summary(),
+            "dynamodb_calls": dict(self.dynamodb.calls),
+            "sqs_calls": dict(self.sqs.calls),
+        }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"checkouts: {result['completed']}/{result['checkouts']} completed in {result['elapsed_seconds']:.2f}s "
+          f"({result['throughput_per_second']:.1f}/s), outcomes {result['outcomes']}")
+    print(f"{'stage (ms)':<24} {'count':>7} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for stage, stats in sorted(result["stages"].items()):
+        print(f"{stage:<24} {stats['count']:>7} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} "
+              f"{stats['p90_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+    print(f"dynamodb calls: {result['dynamodb_calls']}")
+    print(f"sqs calls: {result['sqs_calls']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkouts", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=2, help="payment orders per checkout")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent initializer requests")
+    parser.add_argument("--executor-pollers", type=int, default=2)
+    parser.add_argument("--wallet-pollers", type=int, default=1)
+    parser.add_argument("--psp", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--dynamodb-latency-ms", type=float, default=0.0)
+    parser.add_argument("--sqs-latency-ms", type=float, default=0.0)
+    parser.add_argument("--max-receives", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the pipeline to drain")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(args.psp, args.dynamodb_latency_ms, args.sqs_latency_ms, args.max_receives)
+    try:
+        # the Lambdas print EMF metrics to stdout; keep the report readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = pipeline.run(args.checkouts, args.orders, args.clients, args.executor_pollers,
+                                  args.wallet_pollers, args.timeout)
+    finally:
+        pipeline.close()
+
+    result["config"] = vars(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"benchmark": "pipeline", "results": result}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
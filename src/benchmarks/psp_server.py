@@ -0,0 +1,70 @@
+"""Serve the PSP Lambda over plain HTTP, with no AWS involved.
+
+POST /process is passed to the PSP handler as an API Gateway proxy event,
+so the executor can be pointed at it with PSP_URL=http://127.0.0.1:8080.
+The latency model is configured with the usual PSP_LATENCY_* and
+PSP_SLOWDOWN_WINDOWS environment variables.
+
+    PSP_LATENCY_PROFILE='{"distribution": "lognormal", "median_ms": 180, "sigma": 0.6}' \\
+        python -m benchmarks.psp_server --port 8080
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.support import LocalContext, load_lambda
+
+psp = load_lambda("psp")
+
+
+class PspRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately; without this keep-alive clients wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        if self.path != "/process":
+            self._reply(404, json.dumps({"error": "Not found"}), {})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        response = psp.handler({"body": body, "path": self.path, "httpMethod": "POST"}, LocalContext("psp"))
+        self._reply(response["statusCode"], response["body"], response.get("headers", {}))
+
+    def _reply(self, status_code: int, body: str, headers: dict) -> None:
+        payload = body.encode()
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080) -> ThreadingHTTPServer:
+    """Build the server; run it with serve_forever(), in a thread when embedding it."""
+    server = ThreadingHTTPServer((host, port), PspRequestHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port)
+    print(f"PSP listening on http://{args.host}:{server.server_port}/process")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,89 @@
-import json
 import os
+import random
+import threading
 import time
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Any, Dict, List, Optional, Tuple
 import boto3
 from botocore.exceptions import ClientError
 import requests
+from requests.adapters import HTTPAdapter
 
 from pydantic import BaseModel, ValidationError
 from aws_lambda_powertools import Logger
-from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType, process_partial_response
+from aws_lambda_powertools.utilities.batch import EventType
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
-logger = Logger()
+from payments_common import codec
+from payments_common.batch import ConcurrentBatchProcessor, event_records
+from payments_common.business_events import BusinessEventEmitter
+from payments_common.idempotency import IdempotencyStore
+from payments_common.lazy import LazyResource, initialize
+from payments_common.metrics import InvocationMetrics
+from payments_common.resilience import OPEN, AimdLimiter, CircuitBreaker
 
-# otel config
-# import atexit
-# from opentelemetry import metrics
-# from opentelemetry.sdk.metrics import MeterProvider, Counter, Histogram, UpDownCounter, ObservableCounter, ObservableUpDownCounter
-# from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader, AggregationTemporality
-# from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
-# from opentelemetry.sdk.resources import Resource, SERVICE_NAME
+logger = Logger()
+business_events = BusinessEventEmitter(logger, default_stage="EXECUTION")
+log_business_event = business_events.emit
 
 # manual span instrumentation
 from opentelemetry import trace
 
-# _otel_meter_provider = None
-# try:
-#     resource = Resource.create({SERVICE_NAME: os.environ.get("OTEL_SERVICE_NAME", "o11y-payments-executor")})
-#     exporter = OTLPMetricExporter(
-#         preferred_temporality={
-#             Counter: AggregationTemporality.DELTA,
-#             UpDownCounter: AggregationTemporality.CUMULATIVE,
-#             Histogram: AggregationTemporality.DELTA,
-#             ObservableCounter: AggregationTemporality.DELTA,
-#             ObservableUpDownCounter: AggregationTemporality.CUMULATIVE,
-#         }
-#     )
-#     reader = PeriodicExportingMetricReader(exporter=exporter, export_interval_millis=5000)
-#     _otel_meter_provider = MeterProvider(resource=resource, metric_readers=[reader])
-#     metrics.set_meter_provider(_otel_meter_provider)
-#     atexit.register(_otel_meter_provider.shutdown)
-# except Exception as e:
-#     logger.warning(f"OpenTelemetry SDK initialization failed (metrics disabled): {e}")
-
-# meter = metrics.get_meter_provider().get_meter("o11y-payments-executor", "1.0.0")
-# tpv_counter = meter.create_counter(name="payment.tpv", description="Total Payment Volume", unit="1")
-
 # dynatrace layer auto-captures this
 tracer = trace.get_tracer("o11y-payments-executor", "1.0.0")
+# TPV, PSP outcomes and PSP latency, written once per invocation as EMF (and OTLP when enabled)
+metrics = InvocationMetrics(service=os.environ.get("OTEL_SERVICE_NAME", "o11y-payments-executor"))
 
 PAYMENT_RESULTS_QUEUE_URL = os.environ.get("PAYMENT_RESULTS_QUEUE_URL")
 PSP_URL = os.environ.get("PSP_URL")
+# PSP outcomes by checkout_id; unset keeps them in memory only (local runs)
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE")
+# number of SQS records handled in parallel within one invocation; 1 keeps the sequential behaviour
+MAX_RECORD_CONCURRENCY = max(1, int(os.environ.get("MAX_RECORD_CONCURRENCY", "1")))
+# SendMessageBatch accepts at most 10 entries per call
+SQS_BATCH_LIMIT = 10
+PSP_CONNECT_TIMEOUT = float(os.environ.get("PSP_CONNECT_TIMEOUT", "3.05"))
+PSP_READ_TIMEOUT = float(os.environ.get("PSP_READ_TIMEOUT", "10"))
+PSP_MAX_RETRIES = int(os.environ.get("PSP_MAX_RETRIES", "2"))
+PSP_BACKOFF_BASE = float(os.environ.get("PSP_BACKOFF_BASE", "0.1"))
+PSP_BACKOFF_MAX = float(os.environ.get("PSP_BACKOFF_MAX", "1.0"))
+# hedged requests: when a PSP call has not answered within the PSP_HEDGE_QUANTILE of recent PSP
+# latencies, an identical request is sent and the first reply wins. Only safe because the PSP
+# deduplicates on payment_id. PSP_HEDGE_BUDGET caps hedges at that share of PSP calls.
+PSP_HEDGE_ENABLED = os.environ.get("PSP_HEDGE_ENABLED", "false").lower() == "true"
+PSP_HEDGE_QUANTILE = float(os.environ.get("PSP_HEDGE_QUANTILE", "0.95"))
+PSP_HEDGE_BUDGET = float(os.environ.get("PSP_HEDGE_BUDGET", "0.1"))
+PSP_HEDGE_MIN_DELAY_MS = float(os.environ.get("PSP_HEDGE_MIN_DELAY_MS", "50"))
+# used until PSP_HEDGE_MIN_SAMPLES latencies have been observed by the container
+PSP_HEDGE_INITIAL_DELAY_MS = float(os.environ.get("PSP_HEDGE_INITIAL_DELAY_MS", "1000"))
+PSP_HEDGE_MIN_SAMPLES = 20
+PSP_HEDGE_WINDOW = int(os.environ.get("PSP_HEDGE_WINDOW", "200"))
+# PSP guard: the breaker opens at PSP_BREAKER_FAILURE_RATE 5xx/timeouts over the last
+# PSP_BREAKER_WINDOW_SECONDS (once PSP_BREAKER_MIN_CALLS calls were seen) and fails records fast
+# for PSP_BREAKER_OPEN_SECONDS; concurrent PSP calls are capped by an AIMD limit
+PSP_BREAKER_ENABLED = os.environ.get("PSP_BREAKER_ENABLED", "true").lower() == "true"
+PSP_BREAKER_FAILURE_RATE = float(os.environ.get("PSP_BREAKER_FAILURE_RATE", "0.5"))
+PSP_BREAKER_MIN_CALLS = int(os.environ.get("PSP_BREAKER_MIN_CALLS", "10"))
+PSP_BREAKER_WINDOW_SECONDS = float(os.environ.get("PSP_BREAKER_WINDOW_SECONDS", "30"))
+PSP_BREAKER_OPEN_SECONDS = float(os.environ.get("PSP_BREAKER_OPEN_SECONDS", "15"))
+PSP_CONCURRENCY_WAIT_SECONDS = float(os.environ.get("PSP_CONCURRENCY_WAIT_SECONDS", "5"))
+# records are not started, and PSP timeouts and retries are cut short, once less than this is left
+# of the invocation, so a slow batch reports its unstarted records instead of timing out; 0 disables
+DEADLINE_MARGIN_MS = float(os.environ.get("DEADLINE_MARGIN_MS", "3000"))
 
-sqs = boto3.client("sqs")
-
-def log_business_event(msg: str, event_type: str, checkout_id: str, outcome: str, stage: str = "EXECUTION", data: dict = None):
-    """Emit structured Business Event log for Dynatrace extraction."""
-    logger.info(msg,
-        event_type=event_type,
-        event_provider="payment-service",
-        event_version="1.0",
-        biz_checkout_id=checkout_id,
-        biz_timestamp=datetime.now(timezone.utc).isoformat(),
-        outcome=outcome,
-        stage=stage,
-        **(data or {})
-    )
+sqs = LazyResource(
+    lambda: boto3.client("sqs"),
+    primer=lambda client: client.get_queue_attributes(QueueUrl=PAYMENT_RESULTS_QUEUE_URL, AttributeNames=["QueueArn"])
+)
+dynamodb_client = LazyResource(
+    lambda: boto3.resource("dynamodb").meta.client,
+    primer=lambda client: client.describe_table(TableName=IDEMPOTENCY_TABLE) if IDEMPOTENCY_TABLE else None
+)
+initialize(sqs, dynamodb_client)
+
+# a redelivered record reuses the stored outcome instead of charging the PSP again
+psp_outcomes = IdempotencyStore(client=dynamodb_client, table_name=IDEMPOTENCY_TABLE)
 
 class ExecutionMessage(BaseModel):
     checkout_id: str
@@ -74,6 +91,257 @@ class ExecutionMessage(BaseModel):
     currency: str
     credit_card_info: Dict[str, Any]
     simulate: Optional[Dict[str, Any]] = None
+    # schema version 2 carries the order breakdown, forwarded to the wallet as is
+    schema_version: int = 1
+    orders: Optional[List[Dict[str, Any]]] = None
+
+class PspClient:
+    """Keep-alive HTTP client for the PSP API.
+
+    The session and its connection pool live at module scope, so warm
+    invocations reuse established TCP/TLS connections instead of doing a new
+    handshake per payment. Connection errors and 5xx responses are retried
+    with full-jitter exponential backoff and every retry is recorded as an
+    event on the given span.
+
+    With a deadline the connect and read timeouts of each attempt are
+    capped by the time left, and no retry is made whose backoff would reach
+    the deadline.
+
+    With hedging enabled every attempt that has not answered within the
+    hedge quantile of the latencies seen by this container is duplicated,
+    as long as the hedge budget allows: each call earns hedge_budget of a
+    token (up to HEDGE_BURST), each hedge spends one. The hedge delay is
+    measured from when the attempt starts on a worker, not from when it was
+    queued. Hedges run on their own pool of at most HEDGE_BURST workers and
+    an attempt is not hedged while that pool is busy, so hedges left running
+    in the background cannot hold up the attempts themselves. The first
+    reply wins; the other request is left to finish in the background.
+    """
+
+    HEDGE_BURST = 10.0
+    # floor for the timeouts of an attempt made close to the deadline
+    MIN_TIMEOUT = 0.1
+
+    def __init__(self, base_url: Optional[str], connect_timeout: float, read_timeout: float,
+                 max_retries: int, backoff_base: float, backoff_max: float, pool_size: int,
+                 hedge_enabled: bool = False, hedge_quantile: float = 0.95, hedge_budget: float = 0.1,
+                 hedge_min_delay_ms: float = 50, hedge_initial_delay_ms: float = 1000, hedge_window: int = 200):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.hedge_min_delay_ms = hedge_min_delay_ms
+        self.hedge_initial_delay_ms = hedge_initial_delay_ms
+        self.session = requests.Session()
+        hedge_workers = min(pool_size, int(self.HEDGE_BURST)) if hedge_enabled else 0
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size + hedge_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._latencies_ms: deque = deque(maxlen=hedge_window)
+        self._hedge_tokens = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="psp") if hedge_enabled else None
+        self._hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="psp-hedge") if hedge_enabled else None
+        # free hedge workers; a hedge is only sent when one is free, so hedges never queue
+        self._hedge_slots = threading.BoundedSemaphore(max(1, hedge_workers))
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def hedge_delay_ms(self) -> float:
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+        if len(latencies) < PSP_HEDGE_MIN_SAMPLES:
+            return self.hedge_initial_delay_ms
+        return max(self.hedge_min_delay_ms, latencies[int(self.hedge_quantile * (len(latencies) - 1))])
+
+    def _take_hedge_token(self) -> bool:
+        with self._lock:
+            if self._hedge_tokens < 1:
+                return False
+            self._hedge_tokens -= 1
+            return True
+
+    def _attempt_timeout(self, deadline: Optional[float]) -> Tuple[float, float]:
+        if deadline is None:
+            return self.timeout
+        left = max(self.MIN_TIMEOUT, deadline - time.monotonic())
+        return min(self.timeout[0], left), min(self.timeout[1], left)
+
+    def _timed_post(self, url: str, body: str, timeout: Tuple[float, float]) -> requests.Response:
+        started = time.perf_counter()
+        response = self.session.post(url, data=body, headers={"Content-Type": "application/json"}, timeout=timeout)
+        if response.status_code < 500:
+            with self._lock:
+                self._latencies_ms.append((time.perf_counter() - started) * 1000)
+        return response
+
+    def _send(self, url: str, body: str, timeout: Tuple[float, float], span: Optional[trace.Span],
+              hedges: Dict[str, int]) -> requests.Response:
+        """Run one attempt, hedged when enabled and the attempt is slower than the hedge delay."""
+        if not self.hedge_enabled:
+            return self._timed_post(url, body, timeout)
+
+        with self._lock:
+            self._hedge_tokens = min(self.HEDGE_BURST, self._hedge_tokens + self.hedge_budget)
+        delay_ms = self.hedge_delay_ms()
+        started = threading.Event()
+
+        def run_primary() -> requests.Response:
+            started.set()
+            return self._timed_post(url, body, timeout)
+
+        primary = self._executor.submit(run_primary)
+        # the time the attempt waits for a worker does not count toward the hedge delay
+        started.wait()
+        try:
+            return primary.result(timeout=delay_ms / 1000)
+        except FutureTimeoutError:
+            pass
+        if not self._hedge_slots.acquire(blocking=False):
+            return primary.result()
+        if not self._take_hedge_token():
+            self._hedge_slots.release()
+            return primary.result()
+
+        hedge = self._hedge_executor.submit(self._timed_post, url, body, timeout)
+        hedge.add_done_callback(lambda _: self._hedge_slots.release())
+        hedges["sent"] += 1
+        if span is not None:
+            span.add_event("psp.hedge", {"hedge.delay_ms": int(delay_ms)})
+            span.set_attribute("psp.hedge.count", hedges["sent"])
+        logger.info("Hedging PSP call", delay_ms=int(delay_ms))
+
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # the primary wins a tie
+            for future in sorted(done, key=lambda future: future is not primary):
+                if future.exception() is None:
+                    if future is hedge:
+                        hedges["won"] += 1
+                        if span is not None:
+                            span.set_attribute("psp.hedge.won", hedges["won"])
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def post(self, path: str, payload: Dict[str, Any], span: Optional[trace.Span] = None,
+             deadline: Optional[float] = None) -> requests.Response:
+        """POST payload to the PSP; deadline is a time.monotonic() value the call must not outlast."""
+        url = f"{self.base_url}{path}"
+        body = codec.dumps(payload)
+        hedges = {"sent": 0, "won": 0}
+        if span is not None and self.hedge_enabled:
+            span.set_attribute("psp.hedge.count", 0)
+            span.set_attribute("psp.hedge.won", 0)
+        attempt = 0
+        while True:
+            error: Optional[requests.exceptions.ConnectionError] = None
+            try:
+                response = self._send(url, body, self._attempt_timeout(deadline), span, hedges)
+                if response.status_code < 500 or attempt >= self.max_retries:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except requests.exceptions.ConnectionError as err:
+                if attempt >= self.max_retries:
+                    raise
+                reason = type(err).__name__
+                error = err
+
+            delay = self._backoff(attempt)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                logger.warning("Not retrying PSP call past the invocation deadline", attempt=attempt, reason=reason)
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            if span is not None:
+                span.add_event("psp.retry", {
+                    "retry.attempt": attempt,
+                    "retry.reason": reason,
+                    "retry.backoff_ms": int(delay * 1000),
+                })
+                span.set_attribute("psp.retry_count", attempt)
+            logger.warning("Retrying PSP call", attempt=attempt, reason=reason, backoff_ms=int(delay * 1000))
+            time.sleep(delay)
+
+
+psp_client = PspClient(
+    base_url=PSP_URL,
+    connect_timeout=PSP_CONNECT_TIMEOUT,
+    read_timeout=PSP_READ_TIMEOUT,
+    max_retries=PSP_MAX_RETRIES,
+    backoff_base=PSP_BACKOFF_BASE,
+    backoff_max=PSP_BACKOFF_MAX,
+    pool_size=MAX_RECORD_CONCURRENCY,
+    hedge_enabled=PSP_HEDGE_ENABLED,
+    hedge_quantile=PSP_HEDGE_QUANTILE,
+    hedge_budget=PSP_HEDGE_BUDGET,
+    hedge_min_delay_ms=PSP_HEDGE_MIN_DELAY_MS,
+    hedge_initial_delay_ms=PSP_HEDGE_INITIAL_DELAY_MS,
+    hedge_window=PSP_HEDGE_WINDOW,
+)
+
+class PspUnavailableError(RuntimeError):
+    """The PSP guard refused the call; SQS redelivers the record later."""
+
+
+def log_breaker_state_change(previous_state: str, state: str, failure_share: float) -> None:
+    logger.warning("PSP circuit breaker state changed",
+        previous_state=previous_state,
+        circuit_state=state,
+        failure_share=round(failure_share, 3)
+    )
+
+
+psp_breaker = CircuitBreaker(
+    failure_rate=PSP_BREAKER_FAILURE_RATE,
+    min_calls=PSP_BREAKER_MIN_CALLS,
+    window_seconds=PSP_BREAKER_WINDOW_SECONDS,
+    open_seconds=PSP_BREAKER_OPEN_SECONDS,
+    on_state_change=log_breaker_state_change,
+)
+psp_limiter = AimdLimiter(max_limit=MAX_RECORD_CONCURRENCY)
+
+
+def reject_psp_call(message: ExecutionMessage, reason: str) -> None:
+    """Fail the record without calling the PSP."""
+    circuit_state = psp_breaker.state
+    metrics.add("psp.outcome", error_code=reason)
+    span = trace.get_current_span()
+    span.set_attribute("psp.circuit.state", circuit_state)
+    span.set_attribute("psp.rejected", reason)
+    logger.warning("PSP call rejected",
+        checkout_id=message.checkout_id,
+        reason=reason,
+        circuit_state=circuit_state,
+        concurrency_limit=int(psp_limiter.limit),
+        in_flight=psp_limiter.in_flight
+    )
+    log_business_event(
+        msg="PSP call rejected",
+        event_type="payment.psp.response",
+        checkout_id=message.checkout_id,
+        outcome="FAILURE",
+        stage="PSP_INTEGRATION",
+        data={
+            "amount.total": message.total_amount,
+            "amount.currency": message.currency,
+            "psp.response.status": "FAILED",
+            "psp.response.error_code": reason,
+            "psp.circuit.state": circuit_state,
+            "error.category": "PSP"
+        }
+    )
+    raise PspUnavailableError(f"PSP call rejected: {reason}")
+
 
 def simulate_error(simulate: Optional[Dict[str, Any]] = None) -> None:
     if not simulate:
@@ -91,7 +359,28 @@ def simulate_error(simulate: Optional[Dict[str, Any]] = None) -> None:
         raise RuntimeError(error_msg)
 
 
-def process_payment_execution(message: ExecutionMessage) -> None:
+def build_results_message(message: ExecutionMessage, status: str, error_code: Optional[str]) -> Dict[str, Any]:
+    results_message = {
+        "checkout_id": message.checkout_id,
+        "status": status,
+        "error_code": error_code,
+        "simulate": message.simulate or {},
+        "schema_version": message.schema_version,
+    }
+    if message.orders is not None:
+        results_message["orders"] = message.orders
+    return results_message
+
+def process_payment_execution(message: ExecutionMessage) -> Dict[str, Any]:
+    """Charge the payment at the PSP and return the message for the results queue."""
+    if outcome := psp_outcomes.get(message.checkout_id):
+        logger.info("Reusing stored PSP outcome",
+            checkout_id=message.checkout_id,
+            payment_status=outcome["status"]
+        )
+        metrics.add("psp.outcome_reused")
+        return build_results_message(message, outcome["status"], outcome["error_code"])
+
     simulate_error(message.simulate)
     
     if not PSP_URL:
@@ -107,22 +396,40 @@ def process_payment_execution(message: ExecutionMessage) -> None:
         psp_payload["simulate"] = message.simulate
         logger.info("Passing simulate config to PSP", simulate_config=message.simulate)
     
+    if PSP_BREAKER_ENABLED and psp_breaker.state == OPEN:
+        reject_psp_call(message, "CIRCUIT_OPEN")
+    # the PSP call, its retries and the wait for a concurrency slot end at the deadline margin
+    batch_processor.check_deadline("the PSP call")
+    remaining_ms = batch_processor.remaining_ms()
+    deadline = None if remaining_ms is None else time.monotonic() + remaining_ms / 1000
+    wait_seconds = PSP_CONCURRENCY_WAIT_SECONDS if deadline is None else min(PSP_CONCURRENCY_WAIT_SECONDS, remaining_ms / 1000)
+    psp_started = psp_limiter.acquire(timeout=wait_seconds)
+    if psp_started is None:
+        reject_psp_call(message, "CONCURRENCY_LIMIT")
+    breaker_ticket = psp_breaker.allow() if PSP_BREAKER_ENABLED else None
+    if PSP_BREAKER_ENABLED and breaker_ticket is None:
+        psp_limiter.release(None)
+        reject_psp_call(message, "CIRCUIT_OPEN")
+
+    psp_ok = False
     start_time = time.time()
     
     try:
         with tracer.start_as_current_span("psp.call") as span:
             span.set_attribute("psp.url", PSP_URL)
             span.set_attribute("payment.checkout_id", message.checkout_id)
-            response = requests.post(
-                f"{PSP_URL}/process",
-                json=psp_payload,
-                timeout=30
-            )
+            span.set_attribute("psp.circuit.state", psp_breaker.state)
+            span.set_attribute("psp.concurrency.limit", int(psp_limiter.limit))
+            span.set_attribute("psp.concurrency.in_flight", psp_limiter.in_flight)
+            response = psp_client.post("/process", psp_payload, span=span, deadline=deadline)
             span.set_attribute("http.status_code", response.status_code)
+        psp_ok = response.status_code < 500
 
         duration = time.time() - start_time
-        
+        metrics.observe("psp.latency", duration * 1000)
+
         if response.status_code >= 500:
+            metrics.add("psp.outcome", error_code="PSP_SERVER_ERROR")
             log_business_event(
                 msg="PSP server error",
                 event_type="payment.psp.response",
@@ -146,6 +453,8 @@ def process_payment_execution(message: ExecutionMessage) -> None:
 
     except requests.exceptions.RequestException as err:
         duration = time.time() - start_time
+        metrics.observe("psp.latency", duration * 1000)
+        metrics.add("psp.outcome", error_code="CONNECTION_ERROR")
         log_business_event(
             msg="PSP connection error",
             event_type="payment.psp.response",
@@ -162,6 +471,10 @@ def process_payment_execution(message: ExecutionMessage) -> None:
             }
         )
         raise
+    finally:
+        psp_limiter.release(psp_ok, psp_started)
+        if PSP_BREAKER_ENABLED:
+            psp_breaker.record(psp_ok, breaker_ticket)
 
     log_business_event(
         msg="PSP response received",
@@ -178,68 +491,96 @@ def process_payment_execution(message: ExecutionMessage) -> None:
         }
     )
 
-    # if status == "SUCCESS":
-    #     try:
-    #         tpv_counter.add(
-    #             float(message.total_amount),
-    #             attributes={"currency": message.currency}
-    #         )
-    #     except Exception as e:
-    #         logger.warning(f"Failed to record TPV metric: {e}")
-    
+    metrics.add("psp.outcome", error_code=error_code or "NONE")
+    if status == "SUCCESS":
+        metrics.add("payment.tpv", float(message.total_amount), unit="None", currency=message.currency)
+
+    psp_outcomes.put(message.checkout_id, {"status": status, "error_code": error_code})
+    return build_results_message(message, status, error_code)
+
+def send_results_batch(results_messages: List[Dict[str, Any]]) -> Dict[int, str]:
+    """Send up to SQS_BATCH_LIMIT results in one SendMessageBatch call.
+
+    Returns the failure reason for each entry index that SQS did not accept.
+    """
     try:
-        results_message = {
-            "checkout_id": message.checkout_id,
-            "status": status,
-            "error_code": error_code,
-            "simulate": message.simulate or {},
-        }
-        
-        sqs.send_message(
+        response = sqs.send_message_batch(
             QueueUrl=PAYMENT_RESULTS_QUEUE_URL,
-            MessageBody=json.dumps(results_message)
-        )
-        
-        log_business_event(
-            msg="Payment sent to wallet queue",
-            event_type="payment.wallet.queued",
-            checkout_id=message.checkout_id,
-            outcome="SUCCESS" if status == "SUCCESS" else "FAILURE",
-            stage="EXECUTION",
-            data={
-                "amount.total": message.total_amount,
-                "amount.currency": message.currency,
-                "payment.status": status,
-                "error.code": error_code
-            }
+            Entries=[
+                {"Id": str(index), "MessageBody": codec.dumps(results_message)}
+                for index, results_message in enumerate(results_messages)
+            ]
         )
     except ClientError as err:
-        logger.exception("Failed to send payment result to results queue",
+        logger.exception("Failed to send payment results to results queue",
             error_type=type(err).__name__,
-            queue_url=PAYMENT_RESULTS_QUEUE_URL
+            queue_url=PAYMENT_RESULTS_QUEUE_URL,
+            batch_size=len(results_messages)
         )
-        raise RuntimeError(f"Error while sending payment result to results queue: {err}") from err
+        return {index: str(err) for index in range(len(results_messages))}
+
+    failed = {int(entry["Id"]): f"{entry.get('Code')}: {entry.get('Message')}" for entry in response.get("Failed", [])}
+    if failed:
+        logger.error("Results queue rejected batch entries",
+            queue_url=PAYMENT_RESULTS_QUEUE_URL,
+            failed_entries=response.get("Failed")
+        )
+    return failed
+
+def publish_results(processed: List[tuple]) -> None:
+    """Flush the results of successfully handled records to the results queue.
+
+    Results are sent with SendMessageBatch in groups of SQS_BATCH_LIMIT. An
+    entry rejected by SQS fails the record that produced it; the redelivered
+    record is published from the stored PSP outcome.
+    """
+    pending = [(record, outcome) for status, outcome, record in processed if status == "success" and outcome]
+
+    for start in range(0, len(pending), SQS_BATCH_LIMIT):
+        chunk = pending[start:start + SQS_BATCH_LIMIT]
+        failed = send_results_batch([results_message for _, (_, results_message) in chunk])
 
-def record_handler(record: Dict[str, Any]) -> None:
+        for index, (record, (message, results_message)) in enumerate(chunk):
+            if index in failed:
+                batch_processor.fail_record(
+                    record,
+                    RuntimeError(f"Error while sending payment result to results queue: {failed[index]}")
+                )
+                continue
+
+            status = results_message["status"]
+            log_business_event(
+                msg="Payment sent to wallet queue",
+                event_type="payment.wallet.queued",
+                checkout_id=message.checkout_id,
+                outcome="SUCCESS" if status == "SUCCESS" else "FAILURE",
+                stage="EXECUTION",
+                data={
+                    "amount.total": message.total_amount,
+                    "amount.currency": message.currency,
+                    "payment.status": status,
+                    "error.code": results_message["error_code"]
+                }
+            )
+
+def record_handler(record: Dict[str, Any]) -> Tuple[ExecutionMessage, Dict[str, Any]]:
     message_body = record.get("body", "{}")
-    data = json.loads(message_body) if isinstance(message_body, str) else message_body
-    execution_message = ExecutionMessage.model_validate(data)
-    process_payment_execution(execution_message)
+    if isinstance(message_body, str):
+        execution_message = ExecutionMessage.model_validate_json(message_body)
+    else:
+        execution_message = ExecutionMessage.model_validate(message_body)
+    return execution_message, process_payment_execution(execution_message)
 
-batch_processor = BatchProcessor(event_type=EventType.SQS)
+batch_processor = ConcurrentBatchProcessor(
+    event_type=EventType.SQS,
+    max_concurrency=MAX_RECORD_CONCURRENCY,
+    deadline_margin_ms=DEADLINE_MARGIN_MS
+)
 
 @logger.inject_lambda_context
+@metrics.flush_after
 def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
-    # try:
-    return process_partial_response(
-        event=event,
-        record_handler=record_handler,
-        processor=batch_processor,
-        context=context
-    )
-    # finally:
-    #     if _otel_meter_provider:
-    #         try:
-    #             _otel_meter_provider.force_flush(timeout_millis=1000)
-    #         except Exception:
-    #             pass
+    with batch_processor(event_records(event), record_handler, context):
+        processed = batch_processor.process()
+        publish_results(processed)
+    return batch_processor.response()
@@ -1,11 +1,16 @@
 import argparse
+import math
 import os
 import random
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 
 import dotenv
 import requests
+from requests.adapters import HTTPAdapter
 
 if os.path.exists(".env"):
     dotenv.load_dotenv()
@@ -53,6 +58,35 @@ def get_error_indices(error_pct, total):
     return set(random.sample(range(total), num_errors))
 
 
+class LatencyHistogram:
+    """HDR-style histogram: latencies kept with 3 significant digits."""
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.total = 0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms):
+        if latency_ms > 0:
+            step = 10 ** (math.floor(math.log10(latency_ms)) - 2)
+            self.counts[math.ceil(latency_ms / step) * step] += 1
+        else:
+            self.counts[0] += 1
+        self.total += 1
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, pct):
+        threshold = math.ceil(self.total * pct / 100)
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen >= threshold:
+                return min(value, self.max_ms)
+        return self.max_ms
+
+
 SELLER_ACCOUNTS = [
     "seller-acct-001",
     "seller-acct-002",
@@ -67,11 +101,14 @@ SELLER_ACCOUNTS = [
 ]
 
 
-def create_invalid_payment():
-    """Create a payment with validation errors."""
-    error_type = random.choice(
-        ["missing_checkout_id", "invalid_amount", "missing_buyer_info", "invalid_email"]
-    )
+VALIDATION_ERROR_TYPES = ["missing_checkout_id", "invalid_amount", "missing_buyer_info", "invalid_email"]
+# BuyerInfo.email is a plain str, so an "invalid_email" payment is accepted with 202
+REJECTED_VALIDATION_ERROR_TYPES = ["missing_checkout_id", "invalid_amount", "missing_buyer_info"]
+
+
+def create_invalid_payment(error_types=VALIDATION_ERROR_TYPES):
+    """Create a payment with one of the given validation errors."""
+    error_type = random.choice(error_types)
 
     payment = {
         "checkout_id": f"chk-{uuid4().hex[:12]}",
@@ -166,11 +203,79 @@ def create_payment(request_num, error_sets, is_validation_error=False):
     return payment, errors
 
 
+def run_open_loop(url, rps, total, error_sets, concurrency, poisson=False):
+    """Send requests at a fixed (or Poisson) arrival rate, independent of response times.
+
+    Latency is measured from the scheduled send time, so queueing in the
+    client when the API slows down is counted instead of hidden.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    by_status = defaultdict(LatencyHistogram)
+    by_category = defaultdict(LatencyHistogram)
+    lock = threading.Lock()
+
+    def send(request_num, scheduled_at):
+        payment, errors = create_payment(
+            request_num, error_sets, request_num in error_sets["validation"]
+        )
+        try:
+            response = session.post(url, json=payment, timeout=30)
+            status = str(response.status_code)
+        except requests.RequestException as e:
+            status = type(e).__name__
+        latency_ms = (time.perf_counter() - scheduled_at) * 1000
+
+        categories = {error.split(":")[0] for error in errors} or {"none"}
+        with lock:
+            by_status[status].record(latency_ms)
+            for category in categories:
+                by_category[category].record(latency_ms)
+
+    start = time.perf_counter()
+    next_at = start
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(total):
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, next_at)
+            next_at += random.expovariate(rps) if poisson else 1 / rps
+    return time.perf_counter() - start, by_status, by_category
+
+
+def print_latency_report(title, histograms):
+    print(f"\n{title}")
+    print(
+        f"  {'group':<22}{'count':>8}"
+        + "".join(f"{f'p{p:g}':>10}" for p in LatencyHistogram.PERCENTILES)
+        + f"{'max':>10}"
+    )
+    for group, histogram in sorted(histograms.items()):
+        print(
+            f"  {group:<22}{histogram.total:>8}"
+            + "".join(f"{histogram.percentile(p):>10.1f}" for p in LatencyHistogram.PERCENTILES)
+            + f"{histogram.max_ms:>10.1f}"
+        )
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Payments simple checker with error simulation"
     )
     parser.add_argument("--errors", action="store_true", help="Enable error simulation")
+    parser.add_argument(
+        "--rps", type=float, help="Open-loop mode: target request rate per second"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=64, help="Open-loop mode: max in-flight requests"
+    )
+    parser.add_argument(
+        "--poisson", action="store_true", help="Open-loop mode: Poisson arrivals instead of a fixed interval"
+    )
     args = parser.parse_args()
 
     if not args.errors:
@@ -193,7 +298,10 @@ if __name__ == "__main__":
     print("=== Payment Simulation Plan ===")
     print(f"Total requests: {TOTAL_REQUESTS}")
     print(f"URL: {URL}")
-    print(f"Inter-request delay (random): {MIN_DELAY_SEC:.2f}s - {MAX_DELAY_SEC:.2f}s")
+    if args.rps:
+        print(f"Open loop: {args.rps:g} req/s, up to {args.concurrency} in flight")
+    else:
+        print(f"Inter-request delay (random): {MIN_DELAY_SEC:.2f}s - {MAX_DELAY_SEC:.2f}s")
     print()
     print("Expected errors:")
     print(
@@ -216,6 +324,17 @@ if __name__ == "__main__":
     )
     print("\n=== Starting Payment Simulation ===\n")
 
+    if args.rps:
+        elapsed, by_status, by_category = run_open_loop(
+            URL, args.rps, TOTAL_REQUESTS, error_sets, args.concurrency, args.poisson
+        )
+        print("=== OPEN LOOP SUMMARY ===")
+        print(f"  Requests: {TOTAL_REQUESTS} in {elapsed:.1f}s")
+        print(f"  Achieved rate: {TOTAL_REQUESTS / elapsed:.1f} req/s (target {args.rps:g})")
+        print_latency_report("Latency by status code (ms):", by_status)
+        print_latency_report("Latency by simulated error (ms):", by_category)
+        raise SystemExit(0)
+
     success_count = 0
     actual_errors = {
         "validation": 0,
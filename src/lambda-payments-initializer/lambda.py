@@ -1,39 +1,53 @@
-import json
 import os
+import random
 import time
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal, InvalidOperation
-from typing import Any, Dict, Optional
+from functools import cached_property
+from typing import Any, Dict, Optional, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
-from pydantic import BaseModel, ValidationError, field_validator
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+from payments_common import codec
+from payments_common.business_events import BusinessEventEmitter
+from payments_common.lazy import LazyResource, initialize
+
 logger = Logger()
+business_events = BusinessEventEmitter(logger, default_stage="INITIALIZATION")
+log_business_event = business_events.emit
 
 PAYMENT_EVENT_TABLE = os.environ.get("PAYMENT_EVENT_TABLE", "PaymentEvent")
 PAYMENT_ORDER_TABLE = os.environ.get("PAYMENT_ORDER_TABLE", "PaymentOrder")
 PAYMENT_EXECUTION_QUEUE_URL = os.environ.get("PAYMENT_EXECUTION_QUEUE_URL", "")
-
-dynamodb = boto3.resource("dynamodb")
-sqs = boto3.client("sqs")
-payment_event_table = dynamodb.Table(PAYMENT_EVENT_TABLE)
-payment_order_table = dynamodb.Table(PAYMENT_ORDER_TABLE)
-
-
-def log_business_event(msg: str, event_type: str, checkout_id: str, outcome: str, stage: str = "INITIALIZATION", data: dict = None):
-    logger.info(msg,
-        event_type=event_type,
-        event_provider="payment-service",
-        event_version="1.0",
-        biz_checkout_id=checkout_id,
-        biz_timestamp=datetime.now(timezone.utc).isoformat(),
-        outcome=outcome,
-        stage=stage,
-        **(data or {})
-    )
+# execution messages of checkouts up to this size carry the order breakdown (schema version 2)
+MAX_INLINE_ORDERS = int(os.environ.get("MAX_INLINE_ORDERS", "500"))
+MESSAGE_SCHEMA_VERSION = 2
+# "transact" writes the event and its orders in one TransactWriteItems call, "sequential" one after another
+PERSISTENCE_MODE = os.environ.get("PERSISTENCE_MODE", "transact")
+PERSISTENCE_CONCURRENCY = max(1, int(os.environ.get("PERSISTENCE_CONCURRENCY", "8")))
+BATCH_WRITE_MAX_RETRIES = int(os.environ.get("BATCH_WRITE_MAX_RETRIES", "4"))
+# "full" echoes the stored payment event in the 202 body, "slim" only the accepted checkout_id
+RESPONSE_MODE = os.environ.get("RESPONSE_MODE", "full")
+# TransactWriteItems accepts at most 100 items, BatchWriteItem 25
+TRANSACT_ITEM_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+
+dynamodb = LazyResource(lambda: boto3.resource("dynamodb"))
+sqs = LazyResource(
+    lambda: boto3.client("sqs"),
+    primer=lambda client: client.get_queue_attributes(QueueUrl=PAYMENT_EXECUTION_QUEUE_URL, AttributeNames=["QueueArn"])
+)
+payment_event_table = LazyResource(lambda: dynamodb.Table(PAYMENT_EVENT_TABLE))
+payment_order_table = LazyResource(lambda: dynamodb.Table(PAYMENT_ORDER_TABLE))
+dynamodb_client = LazyResource(
+    lambda: dynamodb.meta.client,
+    primer=lambda client: client.describe_table(TableName=PAYMENT_EVENT_TABLE)
+)
+initialize(sqs, dynamodb_client, payment_event_table, payment_order_table)
 
 
 def simulate_error(simulate: Optional[Dict[str, Any]] = None) -> None:
@@ -79,21 +93,116 @@ class PaymentEvent(BaseModel):
     buyer_info: BuyerInfo
     credit_card_info: Dict[str, Any]
     payment_orders: list[PaymentOrder]
+    simulate: Optional[Dict[str, Any]] = Field(default=None, exclude=True)
 
-    @property
+    # derived fields are computed once per request and cached on the instance
+    @cached_property
     def total_amount(self) -> str:
         return str(sum(Decimal(o.amount) for o in self.payment_orders))
 
-    @property
+    @cached_property
     def currency(self) -> str:
         return self.payment_orders[0].currency if self.payment_orders else "USD"
 
-    @property
+    @cached_property
     def seller_info(self) -> Dict[str, str]:
         return {o.payment_order_id: o.seller_account for o in self.payment_orders}
 
 
-def process_payment(payment: PaymentEvent, simulate: Optional[Dict] = None) -> Dict:
+class PaymentAccepted(BaseModel):
+    """202 body of RESPONSE_MODE=full, serialized straight from the validated model."""
+    payment_event: PaymentEvent
+    message: str = "Payment event initiated"
+
+
+def build_execution_message(payment: PaymentEvent, simulate: Optional[Dict] = None) -> Dict:
+    message = {
+        "checkout_id": payment.checkout_id,
+        "total_amount": payment.total_amount,
+        "currency": payment.currency,
+        "credit_card_info": payment.credit_card_info,
+        "simulate": simulate or {},
+        "schema_version": 1,
+    }
+    if len(payment.payment_orders) <= MAX_INLINE_ORDERS:
+        message["schema_version"] = MESSAGE_SCHEMA_VERSION
+        message["orders"] = [order.model_dump() for order in payment.payment_orders]
+    return message
+
+
+def build_payment_event_item(payment: PaymentEvent) -> Dict:
+    return {
+        "checkout_id": payment.checkout_id,
+        "buyer_info": payment.buyer_info.model_dump(),
+        "seller_info": payment.seller_info,
+        "credit_card_info": payment.credit_card_info,
+        "is_payment_done": False,
+    }
+
+
+def build_payment_order_item(payment: PaymentEvent, order: PaymentOrder) -> Dict:
+    return {
+        "payment_order_id": order.payment_order_id,
+        "buyer_account": payment.buyer_info.user_id,
+        "amount": order.amount,
+        "currency": order.currency,
+        "checkout_id": payment.checkout_id,
+        "payment_order_status": "NOT_STARTED",
+        "ledger_updated": False,
+        "wallet_updated": False,
+    }
+
+
+def batch_write_orders(order_items: list) -> None:
+    request = {PAYMENT_ORDER_TABLE: [{"PutRequest": {"Item": item}} for item in order_items]}
+    for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(random.uniform(0, min(1.0, 0.05 * (2 ** attempt))))
+        request = dynamodb_client.batch_write_item(RequestItems=request).get("UnprocessedItems") or {}
+        if not request:
+            return
+    raise RuntimeError(f"{len(request[PAYMENT_ORDER_TABLE])} payment orders left unprocessed")
+
+
+def persist_payment(payment: PaymentEvent) -> str:
+    """Write the payment event and its orders, returning the strategy used.
+
+    In "transact" mode a checkout that fits in one transaction is written with
+    a single TransactWriteItems call; larger ones write the event and every
+    25-order BatchWriteItem chunk concurrently. "sequential" keeps the
+    original put_item followed by batch_writer.
+    """
+    event_item = build_payment_event_item(payment)
+    order_items = [build_payment_order_item(payment, order) for order in payment.payment_orders]
+
+    if PERSISTENCE_MODE != "transact":
+        payment_event_table.put_item(Item=event_item)
+        with payment_order_table.batch_writer() as batch:
+            for item in order_items:
+                batch.put_item(Item=item)
+        return "sequential"
+
+    if 1 + len(order_items) <= TRANSACT_ITEM_LIMIT:
+        dynamodb_client.transact_write_items(TransactItems=[
+            {"Put": {"TableName": PAYMENT_EVENT_TABLE, "Item": event_item}},
+            *({"Put": {"TableName": PAYMENT_ORDER_TABLE, "Item": item}} for item in order_items),
+        ])
+        return "transact"
+
+    chunks = [order_items[start:start + BATCH_WRITE_LIMIT] for start in range(0, len(order_items), BATCH_WRITE_LIMIT)]
+    with ThreadPoolExecutor(max_workers=min(PERSISTENCE_CONCURRENCY, len(chunks) + 1)) as pool:
+        futures = [pool.submit(dynamodb_client.put_item, TableName=PAYMENT_EVENT_TABLE, Item=event_item)]
+        futures += [pool.submit(batch_write_orders, chunk) for chunk in chunks]
+        for future in futures:
+            future.result()
+    return "parallel"
+
+
+def process_payment(payment: PaymentEvent, simulate: Optional[Dict] = None) -> Tuple[Any, Dict[str, float]]:
+    """Persist and enqueue a validated payment.
+
+    Returns the response body and the duration in milliseconds of each step.
+    """
     log_business_event(
         msg="Payment checkout initiated",
         event_type="payment.checkout.initiated",
@@ -107,39 +216,19 @@ def process_payment(payment: PaymentEvent, simulate: Optional[Dict] = None) -> D
         }
     )
 
-    payment_event_table.put_item(Item={
-        "checkout_id": payment.checkout_id,
-        "buyer_info": payment.buyer_info.model_dump(),
-        "seller_info": payment.seller_info,
-        "credit_card_info": payment.credit_card_info,
-        "is_payment_done": False,
-    })
-
-    with payment_order_table.batch_writer() as batch:
-        for order in payment.payment_orders:
-            batch.put_item(Item={
-                "payment_order_id": order.payment_order_id,
-                "buyer_account": payment.buyer_info.user_id,
-                "amount": order.amount,
-                "currency": order.currency,
-                "checkout_id": payment.checkout_id,
-                "payment_order_status": "NOT_STARTED",
-                "ledger_updated": False,
-                "wallet_updated": False,
-            })
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    persistence = persist_payment(payment)
+    timings["persist"] = (time.perf_counter() - started) * 1000
 
     simulate_error(simulate)
 
+    started = time.perf_counter()
     sqs.send_message(
         QueueUrl=PAYMENT_EXECUTION_QUEUE_URL,
-        MessageBody=json.dumps({
-            "checkout_id": payment.checkout_id,
-            "total_amount": payment.total_amount,
-            "currency": payment.currency,
-            "credit_card_info": payment.credit_card_info,
-            "simulate": simulate or {},
-        })
+        MessageBody=codec.dumps(build_execution_message(payment, simulate))
     )
+    timings["enqueue"] = (time.perf_counter() - started) * 1000
 
     log_business_event(
         msg="Payment sent to execution queue",
@@ -150,21 +239,50 @@ def process_payment(payment: PaymentEvent, simulate: Optional[Dict] = None) -> D
         data={
             "amount.total": payment.total_amount,
             "amount.currency": payment.currency,
-            "order.count": len(payment.payment_orders)
+            "order.count": len(payment.payment_orders),
+            "persistence.mode": persistence,
+            "timing.persist.ms": round(timings["persist"], 1),
+            "timing.enqueue.ms": round(timings["enqueue"], 1)
         }
     )
 
-    return {"payment_event": payment.model_dump(), "message": "Payment event initiated"}
+    if RESPONSE_MODE == "slim":
+        return {"checkout_id": payment.checkout_id, "message": "Payment event initiated"}, timings
+    return PaymentAccepted(payment_event=payment), timings
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{step};dur={duration:.1f}" for step, duration in timings.items())
 
 
-def build_response(status_code: int, body: Any) -> Dict:
+def build_response(status_code: int, body: Any, headers: Optional[Dict[str, str]] = None) -> Dict:
     return {
         "statusCode": status_code,
-        "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(body, default=str)
+        "headers": {"Content-Type": "application/json", **(headers or {})},
+        "body": codec.dumps(body)
     }
 
 
+def summarize_raw_payment(raw_body: Any) -> Tuple[str, str, str, int]:
+    """Best-effort checkout_id, total, currency and order count of a body that failed validation."""
+    try:
+        body = codec.loads(raw_body) if isinstance(raw_body, str) else raw_body
+    except codec.JSONDecodeError:
+        body = None
+    if not isinstance(body, dict):
+        return "UNKNOWN", "0", "UNKNOWN", 0
+
+    orders = body.get("payment_orders", [])
+    if not isinstance(orders, list):
+        orders = []
+    try:
+        total = str(sum(Decimal(str(o.get("amount", 0))) for o in orders)) if orders else "0"
+        currency = orders[0].get("currency", "UNKNOWN") if orders else "UNKNOWN"
+    except (AttributeError, TypeError, ValueError, InvalidOperation):
+        total, currency = "0", "UNKNOWN"
+    return body.get("checkout_id", "UNKNOWN"), total, currency, len(orders)
+
+
 def format_validation_errors(errors: list) -> list:
     return [
         {
@@ -178,52 +296,61 @@ def format_validation_errors(errors: list) -> list:
 
 @logger.inject_lambda_context
 def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
+    raw_body = event.get("body") or "{}"
     try:
-        body = json.loads(event.get("body", "{}"))
-        checkout_id = body.get("checkout_id", "UNKNOWN")
-    except json.JSONDecodeError:
-        return build_response(400, {"error": "Invalid JSON"})
+        if isinstance(raw_body, str):
+            payment = PaymentEvent.model_validate_json(raw_body)
+        else:
+            payment = PaymentEvent.model_validate(raw_body)
+    except ValidationError as err:
+        errors = err.errors()
+        if any(e.get("type") == "json_invalid" for e in errors):
+            return build_response(400, {"error": "Invalid JSON"})
 
-    orders = body.get("payment_orders", [])
-    try:
-        total = str(sum(Decimal(str(o.get("amount", 0))) for o in orders)) if orders else "0"
-        currency = orders[0].get("currency", "UNKNOWN") if orders else "UNKNOWN"
-    except (TypeError, ValueError, InvalidOperation):
-        total, currency = "0", "UNKNOWN"
+        checkout_id, total, currency, order_count = summarize_raw_payment(raw_body)
+        log_business_event(
+            msg="Payment request received",
+            event_type="payment.request.received",
+            checkout_id=checkout_id,
+            outcome="RECEIVED",
+            stage="REQUEST",
+            data={
+                "amount.total": total,
+                "amount.currency": currency,
+                "order.count": order_count
+            }
+        )
+        logger.warning("Validation failed", validation_errors=errors)
+        log_business_event(
+            msg="Payment validation failed",
+            event_type="payment.checkout.rejected",
+            checkout_id=checkout_id,
+            outcome="REJECTED",
+            stage="VALIDATION",
+            data={
+                "error.code": "VALIDATION_ERROR",
+                "error.message": str(errors[:3]),
+                "order.count": order_count
+            }
+        )
+        return build_response(400, {"error": "Validation failed", "details": format_validation_errors(errors)})
 
     log_business_event(
         msg="Payment request received",
         event_type="payment.request.received",
-        checkout_id=checkout_id,
+        checkout_id=payment.checkout_id,
         outcome="RECEIVED",
         stage="REQUEST",
         data={
-            "amount.total": total,
-            "amount.currency": currency,
-            "order.count": len(orders)
+            "amount.total": payment.total_amount if payment.payment_orders else "0",
+            "amount.currency": payment.currency if payment.payment_orders else "UNKNOWN",
+            "order.count": len(payment.payment_orders)
         }
     )
 
     try:
-        payment = PaymentEvent.model_validate(body)
-        result = process_payment(payment, body.get("simulate"))
-        return build_response(202, result)
-
-    except ValidationError as err:
-        logger.warning("Validation failed", validation_errors=err.errors())
-        log_business_event(
-            msg="Payment validation failed",
-            event_type="payment.checkout.rejected",
-            checkout_id=checkout_id,
-            outcome="REJECTED",
-            stage="VALIDATION",
-            data={
-                "error.code": "VALIDATION_ERROR",
-                "error.message": str(err.errors()[:3]),
-                "order.count": len(orders)
-            }
-        )
-        return build_response(400, {"error": "Validation failed", "details": format_validation_errors(err.errors())})
+        result, timings = process_payment(payment, payment.simulate)
+        return build_response(202, result, headers={"Server-Timing": format_server_timing(timings)})
 
     except ClientError as err:
         logger.exception("AWS service error", error_type=type(err).__name__)
@@ -1,53 +1,166 @@
+"""Load test for the payments initializer API.
+
+Users post valid multi-order checkouts built by checker.create_payment; the
+tasks are weighted with the same error mix as checker.py (*_ERROR_PCT env
+vars) and every scenario is reported under its own name. LOAD_SHAPE=step or
+LOAD_SHAPE=spike drives the user count with a LoadTestShape instead of -u/-r.
+
+    cd src/lambda-payments-initializer
+    LOAD_SHAPE=step locust -f test_perf/locustfile.py --headless --csv /tmp/initializer-perf/step
+
+A JSON summary per scenario is written to RESULTS_JSON (default
+<tempdir>/initializer-perf/<shape>-<timestamp>.json, outside the repository)
+when the test stops, so runs can be compared side by side.
+"""
 import json
 import logging
 import os
-from uuid import uuid4
-from random import randint
+import sys
+import tempfile
+import time
+
 import dotenv
-from locust import HttpUser, between, task
+from locust import HttpUser, LoadTestShape, between, events
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import checker  # noqa: E402
 
 class Config:
     LATENCY_MIN: float = float(os.getenv("LATENCY_MIN", 0.1))
     LATENCY_MAX: float = float(os.getenv("LATENCY_MAX", 2 * 60))
+    LOAD_SHAPE: str = os.getenv("LOAD_SHAPE", "")
+    # step: STEP_USERS more users every STEP_DURATION seconds, STEP_COUNT times
+    STEP_USERS: int = int(os.getenv("STEP_USERS", 10))
+    STEP_DURATION: int = int(os.getenv("STEP_DURATION", 60))
+    STEP_COUNT: int = int(os.getenv("STEP_COUNT", 5))
+    # spike: BASE_USERS, jumping to SPIKE_USERS at SPIKE_AT for SPIKE_DURATION seconds
+    BASE_USERS: int = int(os.getenv("BASE_USERS", 10))
+    SPIKE_USERS: int = int(os.getenv("SPIKE_USERS", 100))
+    SPIKE_AT: int = int(os.getenv("SPIKE_AT", 120))
+    SPIKE_DURATION: int = int(os.getenv("SPIKE_DURATION", 30))
+    SHAPE_DURATION: int = int(os.getenv("SHAPE_DURATION", 300))
+    SPAWN_RATE: float = float(os.getenv("SPAWN_RATE", 10))
+    RESULTS_JSON: str = os.getenv("RESULTS_JSON", "")
 
 dotenv.load_dotenv()
 
 CONFIG = Config()
 
+# scenario -> (checker error set, weight in % of requests, expected status code)
+SCENARIOS = {
+    "validation": ("validation", checker.VALIDATION_ERROR_PCT, 400),
+    "initializer_error": ("initializer", checker.INIT_ERROR_PCT, 500),
+    "executor_error": ("executor", checker.EXEC_ERROR_PCT, 202),
+    "psp_server_error": ("psp_server", checker.PSP_SERVER_ERROR_PCT, 202),
+    "psp_business_error": ("psp_business", checker.PSP_BUSINESS_ERROR_PCT, 202),
+    "wallet_error": ("wallet", checker.WALLET_ERROR_PCT, 202),
+}
+SCENARIOS["happy_path"] = (None, max(0.0, 100 - sum(pct for _, pct, _ in SCENARIOS.values())), 202)
+
+
+def build_scenario_task(name, error_set, expected_status):
+    def scenario(user):
+        if error_set == "validation":
+            # only error types the initializer answers with 400, so no checkout is created
+            payment, _ = checker.create_invalid_payment(checker.REJECTED_VALIDATION_ERROR_TYPES)
+        else:
+            error_sets = {error_set: {0}} if error_set else {}
+            payment, _ = checker.create_payment(0, error_sets)
+        user._send_request("POST", "/", name=name, expected_status=expected_status, json=payment,
+                           headers={"Content-Type": "application/json"})
+    scenario.__name__ = name
+    return scenario
+
+
 class SimulatedUser(HttpUser):
     host = os.getenv("HOST")
     wait_time = between(CONFIG.LATENCY_MIN, CONFIG.LATENCY_MAX)
 
-    @task
-    def simulate_post(self):
-        payment = {
-            "payment_id": str(uuid4()),
-            "amount": randint(1, 1000),
-            "currency": "EUR",
-        }
-
-        headers = {
-            "Content-Type": "application/json",
-        }
-        self._send_request("POST", "/", json=payment, headers=headers)
+    # locust weights are integers: one unit per 0.1% of requests
+    tasks = {
+        build_scenario_task(name, error_set, expected_status): round(pct * 10)
+        for name, (error_set, pct, expected_status) in SCENARIOS.items()
+        if round(pct * 10) > 0
+    }
 
-    def _send_request(self, method, path, **kwargs):
+    def _send_request(self, method, path, name, expected_status, **kwargs):
         try:
-            with self.client.request(method, path, catch_response=True, **kwargs) as response:
+            with self.client.request(method, path, name=name, catch_response=True, **kwargs) as response:
                 log_info = {
                     "HTTP Method": method,
                     "Path": path,
+                    "Scenario": name,
                     "Response code": response.status_code,
-                    "Response body": response.text,
                     "Response time (ms)": response.elapsed.total_seconds() * 1000,
                 }
-                logging.info(json.dumps(log_info))
+                logging.debug(json.dumps(log_info))
 
-                if response.status_code >= 400:
-                    response.failure(f"Failure: Received {response.status_code}")
+                if response.status_code != expected_status:
+                    response.failure(f"Failure: Received {response.status_code}, expected {expected_status}")
                 else:
                     response.success()
 
         except Exception as e:
             logging.error(f"Error during {method} request to {path}: {str(e)}")
             raise
+
+
+if CONFIG.LOAD_SHAPE == "step":
+    class StepLoadShape(LoadTestShape):
+        """Add STEP_USERS users every STEP_DURATION seconds for STEP_COUNT steps."""
+
+        def tick(self):
+            step = int(self.get_run_time() // CONFIG.STEP_DURATION)
+            if step >= CONFIG.STEP_COUNT:
+                return None
+            return (step + 1) * CONFIG.STEP_USERS, CONFIG.SPAWN_RATE
+
+elif CONFIG.LOAD_SHAPE == "spike":
+    class SpikeLoadShape(LoadTestShape):
+        """Hold BASE_USERS, jump to SPIKE_USERS for SPIKE_DURATION seconds, then recover."""
+
+        def tick(self):
+            run_time = self.get_run_time()
+            if run_time >= CONFIG.SHAPE_DURATION:
+                return None
+            if CONFIG.SPIKE_AT <= run_time < CONFIG.SPIKE_AT + CONFIG.SPIKE_DURATION:
+                # spawn the spike users at once
+                return CONFIG.SPIKE_USERS, CONFIG.SPIKE_USERS
+            return CONFIG.BASE_USERS, CONFIG.SPAWN_RATE
+
+
+def summarize_stats(stats):
+    def entry_summary(entry):
+        return {
+            "requests": entry.num_requests,
+            "failures": entry.num_failures,
+            "rps": entry.total_rps,
+            "avg_ms": entry.avg_response_time,
+            **{f"p{pct:g}_ms": entry.get_response_time_percentile(pct / 100) for pct in (50, 90, 99, 99.9)},
+            "max_ms": entry.max_response_time,
+        }
+
+    return {
+        "scenarios": {entry.name: entry_summary(entry) for entry in stats.entries.values()},
+        "total": entry_summary(stats.total),
+    }
+
+
+@events.test_stop.add_listener
+def export_results(environment, **kwargs):
+    path = CONFIG.RESULTS_JSON or os.path.join(
+        tempfile.gettempdir(),
+        "initializer-perf",
+        f"{CONFIG.LOAD_SHAPE or 'fixed'}-{time.strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    summary = {
+        "host": environment.host,
+        "load_shape": CONFIG.LOAD_SHAPE or "fixed",
+        "error_mix_pct": {name: pct for name, (_, pct, _) in SCENARIOS.items()},
+        **summarize_stats(environment.stats),
+    }
+    with open(path, "w") as output:
+        json.dump(summary, output, indent=2)
+    logging.info(f"Results written to {path}")
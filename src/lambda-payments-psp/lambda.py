@@ -1,29 +1,176 @@
 import json
+import math
+import os
 import random
 import time
-from typing import Any, Dict
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional
 
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+from payments_common import codec
+from payments_common.cache import TtlLruCache
+
 logger = Logger()
 
 ERROR_CODES = ["INSUFFICIENT_FUNDS", "CARD_DECLINED", "EXPIRED_CARD", "INVALID_CARD", "FRAUD_SUSPECTED"]
-FAILED_PAYMENT_IDS = set()
+PSP_RESPONSE_CACHE_SIZE = int(os.environ.get("PSP_RESPONSE_CACHE_SIZE", "10000"))
+PSP_RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("PSP_RESPONSE_CACHE_TTL_SECONDS", "900"))
+
+# (status_code, body) last returned per payment_id: a retry after a result gets the same
+# result back, a retry after an injected server error is processed normally
+previous_responses = TtlLruCache(max_entries=PSP_RESPONSE_CACHE_SIZE, ttl_seconds=PSP_RESPONSE_CACHE_TTL_SECONDS)
+
+LATENCY_DISTRIBUTIONS = ("uniform", "lognormal", "pareto")
+
+
+def is_number(value: Any) -> bool:
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return not isinstance(value, bool)
+
+
+def is_latency_profile(value: Any) -> bool:
+    return (
+        isinstance(value, dict)
+        and value.get("distribution", "uniform") in LATENCY_DISTRIBUTIONS
+        and all(is_number(item) for key, item in value.items() if key not in ("distribution", "seed"))
+    )
+
+
+def load_json_env(name: str, default: str, is_valid: Callable[[Any], bool]) -> Any:
+    """Parse a JSON environment variable; a malformed value is logged and replaced by the default."""
+    raw = os.environ.get(name, default)
+    try:
+        value = json.loads(raw)
+    except ValueError as err:
+        logger.error("Invalid JSON in environment variable, using the default", variable=name, error=str(err))
+        return json.loads(default)
+    if not is_valid(value):
+        logger.error("Unexpected value in environment variable, using the default", variable=name, value=raw)
+        return json.loads(default)
+    return value
+
+
+# latency profiles are JSON objects, e.g. {"distribution": "lognormal", "median_ms": 180, "sigma": 0.6};
+# currency and amount band profiles are merged over the default one, simulate.psp.latency last
+PSP_LATENCY_PROFILE = load_json_env("PSP_LATENCY_PROFILE", "{}", is_latency_profile)
+PSP_LATENCY_CURRENCY_PROFILES = load_json_env(
+    "PSP_LATENCY_CURRENCY_PROFILES", "{}",
+    lambda value: isinstance(value, dict) and all(is_latency_profile(profile) for profile in value.values())
+)
+# [{"min_amount": 1000, "profile": {...}}, ...]; the highest band not above the amount applies
+PSP_LATENCY_AMOUNT_BANDS = load_json_env(
+    "PSP_LATENCY_AMOUNT_BANDS", "[]",
+    lambda value: isinstance(value, list) and all(
+        isinstance(band, dict) and is_number(band.get("min_amount")) and is_latency_profile(band.get("profile"))
+        for band in value
+    )
+)
+# [{"start_s": 300, "duration_s": 60, "every_s": 900, "multiplier": 4}]; without every_s the
+# window is relative to container start and happens once
+PSP_SLOWDOWN_WINDOWS = load_json_env(
+    "PSP_SLOWDOWN_WINDOWS", "[]",
+    lambda value: isinstance(value, list) and all(
+        isinstance(window, dict) and is_number(window.get("duration_s"))
+        and all(is_number(item) for item in window.values())
+        for window in value
+    )
+)
+# with a seed every payment_id always gets the same latency, whatever the arrival order
+PSP_LATENCY_SEED = os.environ.get("PSP_LATENCY_SEED")
 
 
 def build_response(status_code: int, body: Any) -> Dict:
     return {
         "statusCode": status_code,
         "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(body)
+        "body": codec.dumps(body)
     }
 
 
+class LatencyModel:
+    """Processing delay of the simulated PSP.
+
+    Supported distributions: uniform (min_ms/max_ms, the historical
+    100-400 ms default), lognormal (median_ms/sigma) and pareto
+    (scale_ms/alpha) for heavy tails. Samples are capped at cap_ms and
+    multiplied by any slowdown window active at call time.
+    """
+
+    DEFAULT_PROFILE = {"distribution": "uniform", "min_ms": 100, "max_ms": 400, "cap_ms": 30000}
+
+    def __init__(self, profile: Dict[str, Any], currency_profiles: Dict[str, Dict[str, Any]],
+                 amount_bands: List[Dict[str, Any]], slowdown_windows: List[Dict[str, Any]], seed: Optional[str] = None):
+        self.profile = {**self.DEFAULT_PROFILE, **profile}
+        self.currency_profiles = currency_profiles
+        self.amount_bands = sorted(amount_bands, key=lambda band: float(band["min_amount"]))
+        self.slowdown_windows = slowdown_windows
+        self.seed = seed
+        self.started_at = time.time()
+
+    def resolve_profile(self, amount: Any, currency: str, override: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        profile = {**self.profile, **self.currency_profiles.get(currency, {})}
+        try:
+            value = Decimal(str(amount))
+        except InvalidOperation:
+            value = None
+        bands = [band for band in self.amount_bands if value is not None and value >= Decimal(str(band["min_amount"]))]
+        if bands:
+            profile.update(bands[-1]["profile"])
+        return {**profile, **(override or {})}
+
+    def slowdown_multiplier(self, now: float) -> float:
+        multiplier = 1.0
+        for window in self.slowdown_windows:
+            if every := window.get("every_s"):
+                offset = now % float(every)
+            else:
+                offset = now - self.started_at
+            start = float(window.get("start_s", 0))
+            if start <= offset < start + float(window["duration_s"]):
+                multiplier *= float(window.get("multiplier", 1))
+        return multiplier
+
+    def _rng(self, payment_id: str, seed: Optional[Any]) -> random.Random:
+        if seed is None:
+            return random
+        return random.Random(f"{seed}:{payment_id}")
+
+    def sample_ms(self, payment_id: str, amount: Any, currency: str, override: Optional[Dict[str, Any]] = None) -> float:
+        profile = self.resolve_profile(amount, currency, override)
+        rng = self._rng(payment_id, profile.get("seed", self.seed))
+        distribution = profile["distribution"]
+
+        if distribution == "uniform":
+            latency = rng.uniform(float(profile["min_ms"]), float(profile["max_ms"]))
+        elif distribution == "lognormal":
+            latency = float(profile["median_ms"]) * math.exp(rng.gauss(0, float(profile.get("sigma", 0.5))))
+        elif distribution == "pareto":
+            latency = float(profile["scale_ms"]) * rng.paretovariate(float(profile.get("alpha", 2.0)))
+        else:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+
+        latency *= self.slowdown_multiplier(time.time())
+        return min(latency, float(profile["cap_ms"]))
+
+
+latency_model = LatencyModel(
+    profile=PSP_LATENCY_PROFILE,
+    currency_profiles=PSP_LATENCY_CURRENCY_PROFILES,
+    amount_bands=PSP_LATENCY_AMOUNT_BANDS,
+    slowdown_windows=PSP_SLOWDOWN_WINDOWS,
+    seed=PSP_LATENCY_SEED,
+)
+
+
 @logger.inject_lambda_context
 def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
     try:
-        body = json.loads(event.get("body", "{}")) if isinstance(event.get("body"), str) else event.get("body", {})
+        body = codec.loads(event.get("body", "{}")) if isinstance(event.get("body"), str) else event.get("body", {})
         payment_id = body.get("payment_id")
         amount = body.get("amount")
         currency = body.get("currency")
@@ -34,21 +181,28 @@ def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
             return build_response(400, {"error": "Missing required fields: payment_id, amount, currency"})
         
         logger.append_keys(payment_id=payment_id)
-        logger.info("PSP processing payment", amount=amount, currency=currency)
+
+        previous = previous_responses.get(payment_id)
+        if previous and previous[0] == 200:
+            logger.info("Returning previous PSP response", status=previous[1]["status"])
+            return build_response(*previous)
+
+        psp_config = simulate.get("psp", {})
+        latency_ms = latency_model.sample_ms(payment_id, amount, currency, psp_config.get("latency"))
+        logger.info("PSP processing payment", amount=amount, currency=currency, latency_ms=int(latency_ms))
         
-        time.sleep(random.uniform(0.1, 0.4))
+        time.sleep(latency_ms / 1000)
         
-        psp_config = simulate.get("psp", {})
         status = "success"
         error_code = None
         
-        if psp_config.get("server_error") and payment_id not in FAILED_PAYMENT_IDS:
-            FAILED_PAYMENT_IDS.add(payment_id)
+        if psp_config.get("server_error") and previous is None:
+            error_body = {"error": "PSP service temporarily unavailable"}
+            previous_responses.put(payment_id, (500, error_body))
             logger.error("Simulating server error", amount=amount, currency=currency)
-            return build_response(500, {"error": "PSP service temporarily unavailable"})
+            return build_response(500, error_body)
 
-        if psp_config.get("error") and payment_id not in FAILED_PAYMENT_IDS:
-            FAILED_PAYMENT_IDS.add(payment_id)
+        if psp_config.get("error"):
             status = "failed"
             error_code = psp_config.get("error_code") or random.choice(ERROR_CODES)
             logger.warning("Simulating payment failure", error_code=error_code)
@@ -56,11 +210,12 @@ def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
         response_body = {"payment_id": payment_id, "status": status}
         if error_code:
             response_body["error_code"] = error_code
+        previous_responses.put(payment_id, (200, response_body))
         
         logger.info("Payment processed", status=status, amount=amount, currency=currency)
         return build_response(200, response_body)
     
-    except json.JSONDecodeError:
+    except codec.JSONDecodeError:
         logger.exception("Invalid JSON in request body")
         return build_response(400, {"error": "Invalid JSON in request body"})
     
@@ -1,44 +1,80 @@
-import json
+import functools
 import os
+import random
 import time
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 from pydantic import BaseModel
 from aws_lambda_powertools import Logger
-from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType, process_partial_response
+from aws_lambda_powertools.utilities.batch import EventType
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+from payments_common import codec
+from payments_common.batch import ConcurrentBatchProcessor, DeadlineExceededError, event_records
+from payments_common.business_events import BusinessEventEmitter
+from payments_common.lazy import LazyResource, initialize
+
 logger = Logger()
+business_events = BusinessEventEmitter(logger, default_stage="SETTLEMENT")
+log_business_event = business_events.emit
 
 PAYMENT_EVENT_TABLE = os.environ.get("PAYMENT_EVENT_TABLE", "PaymentEvent")
 PAYMENT_ORDER_TABLE = os.environ.get("PAYMENT_ORDER_TABLE", "PaymentOrder")
 WALLET_TABLE = os.environ.get("WALLET_TABLE", "Wallet")
+# TransactWriteItems accepts at most 100 items per request
+TRANSACT_ITEM_LIMIT = 100
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_LIMIT = 100
+PREFETCH_CONCURRENCY = max(1, int(os.environ.get("PREFETCH_CONCURRENCY", "10")))
+PREFETCH_MAX_RETRIES = int(os.environ.get("PREFETCH_MAX_RETRIES", "4"))
+# orders per checkout_id-index page; checkouts spanning several pages are settled page by page
+ORDER_PAGE_SIZE = max(1, int(os.environ.get("ORDER_PAGE_SIZE", "50")))
+# records, order pages and settlement transactions are not started once less than this is left of
+# the invocation; the records left over are reported as batch item failures. 0 disables
+DEADLINE_MARGIN_MS = float(os.environ.get("DEADLINE_MARGIN_MS", "3000"))
 
-dynamodb = boto3.resource("dynamodb")
-payment_event_table = dynamodb.Table(PAYMENT_EVENT_TABLE)
-payment_order_table = dynamodb.Table(PAYMENT_ORDER_TABLE)
-wallet_table = dynamodb.Table(WALLET_TABLE)
-
-def log_business_event(msg: str, event_type: str, checkout_id: str, outcome: str, stage: str = "SETTLEMENT", data: dict = None):
-    logger.info(msg,
-        event_type=event_type,
-        event_provider="payment-service",
-        event_version="1.0",
-        biz_checkout_id=checkout_id,
-        biz_timestamp=datetime.now(timezone.utc).isoformat(),
-        outcome=outcome,
-        stage=stage,
-        **(data or {})
-    )
+def parse_shard_counts(value: str) -> Dict[str, int]:
+    """Parse WALLET_SHARD_COUNTS; malformed entries are logged and leave the merchant on 1 shard."""
+    shard_counts = {}
+    for pair in filter(None, (part.strip() for part in value.split(","))):
+        merchant_id, _, count = pair.partition("=")
+        merchant_id = merchant_id.strip()
+        if not merchant_id or not count.strip().isdecimal() or int(count) < 1:
+            logger.error("Invalid WALLET_SHARD_COUNTS entry, using 1 shard", entry=pair)
+            continue
+        shard_counts[merchant_id] = min(TRANSACT_ITEM_LIMIT, int(count))
+    return shard_counts
+
+# hot merchants whose credits are spread over N Wallet items, e.g. "seller-acct-001=8,seller-acct-002=4";
+# shard 0 is the merchant's own item, shard n > 0 is stored under "<merchant_id>#<n>"
+WALLET_SHARD_COUNTS = parse_shard_counts(os.environ.get("WALLET_SHARD_COUNTS", ""))
+
+dynamodb = LazyResource(lambda: boto3.resource("dynamodb"))
+payment_event_table = LazyResource(lambda: dynamodb.Table(PAYMENT_EVENT_TABLE))
+payment_order_table = LazyResource(lambda: dynamodb.Table(PAYMENT_ORDER_TABLE))
+dynamodb_client = LazyResource(
+    lambda: dynamodb.meta.client,
+    primer=lambda client: client.describe_table(TableName=PAYMENT_EVENT_TABLE)
+)
+initialize(dynamodb_client, payment_event_table, payment_order_table)
+
+class SettlementOrder(BaseModel):
+    payment_order_id: str
+    seller_account: str
+    amount: str
+    currency: str
 
 class PaymentResultMessage(BaseModel):
     checkout_id: str
     status: str
     error_code: Optional[str] = None
     simulate: Optional[Dict[str, Any]] = None
+    # schema version 2 carries the order breakdown so settlement needs no reads
+    schema_version: int = 1
+    orders: Optional[List[SettlementOrder]] = None
 
 def simulate_error(simulate: Optional[Dict[str, Any]] = None) -> None:
     if not simulate:
@@ -55,16 +91,254 @@ def simulate_error(simulate: Optional[Dict[str, Any]] = None) -> None:
         logger.error("Simulating wallet error", error=error_msg)
         raise RuntimeError(error_msg)
 
-def process_payment_result(message: PaymentResultMessage) -> Dict[str, Any]:
+class BatchLookups:
+    """PaymentEvent items and checkout orders prefetched for one invocation.
+
+    A missing key means the lookup was not prefetched and has to be read by
+    the record handler; a PaymentEvent cached as None does not exist.
+    Checkouts whose orders span several pages keep their first page and its
+    LastEvaluatedKey in first_pages, so streaming resumes after it.
+    """
+
+    def __init__(self):
+        self.payment_events: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.payment_orders: Dict[str, List[Dict[str, Any]]] = {}
+        self.first_pages: Dict[str, Tuple[List[Dict[str, Any]], Dict[str, Any]]] = {}
+
+def batch_get_payment_events(checkout_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Fetch PaymentEvent items with BatchGetItem, retrying unprocessed keys with backoff.
+
+    Keys still unprocessed after PREFETCH_MAX_RETRIES are left out of the result.
+    """
+    payment_events: Dict[str, Optional[Dict[str, Any]]] = {}
+    for start in range(0, len(checkout_ids), BATCH_GET_LIMIT):
+        keys = checkout_ids[start:start + BATCH_GET_LIMIT]
+        payment_events.update({checkout_id: None for checkout_id in keys})
+        request = {PAYMENT_EVENT_TABLE: {"Keys": [{"checkout_id": checkout_id} for checkout_id in keys]}}
+
+        for attempt in range(PREFETCH_MAX_RETRIES + 1):
+            if attempt:
+                time.sleep(random.uniform(0, min(1.0, 0.05 * (2 ** attempt))))
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(PAYMENT_EVENT_TABLE, []):
+                payment_events[item["checkout_id"]] = item
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+
+        if request:
+            unprocessed = [key["checkout_id"] for key in request[PAYMENT_EVENT_TABLE]["Keys"]]
+            logger.warning("PaymentEvent keys left unprocessed", checkout_ids=unprocessed)
+            for checkout_id in unprocessed:
+                payment_events.pop(checkout_id, None)
+    return payment_events
+
+def query_payment_orders(checkout_id: str, exclusive_start_key: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Read one checkout_id-index page; returns its orders and the LastEvaluatedKey."""
+    request = {
+        "TableName": PAYMENT_ORDER_TABLE,
+        "IndexName": "checkout_id-index",
+        "KeyConditionExpression": "checkout_id = :checkout_id",
+        "ExpressionAttributeValues": {":checkout_id": checkout_id},
+        "Limit": ORDER_PAGE_SIZE
+    }
+    if exclusive_start_key:
+        request["ExclusiveStartKey"] = exclusive_start_key
+    # low-level client: unlike Table resources it is safe to share between threads
+    response = dynamodb_client.query(**request)
+    return response.get("Items", []), response.get("LastEvaluatedKey")
+
+def iter_payment_order_pages(checkout_id: str, first_page: Optional[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]] = None) -> Iterator[Tuple[List[Dict[str, Any]], bool]]:
+    """Yield (orders, is_last) for every non-empty page of a checkout's orders.
+
+    One page is read ahead so the last page is known before it is settled;
+    at most two pages are held at a time. first_page is an already read
+    (orders, LastEvaluatedKey) first page to resume from.
+    """
+    page, last_key = first_page or query_payment_orders(checkout_id)
+    while last_key:
+        next_page, last_key = query_payment_orders(checkout_id, last_key)
+        if next_page:
+            if page:
+                yield page, False
+            page = next_page
+    if page:
+        yield page, True
+
+def prefetch_lookups(records: List[Dict[str, Any]]) -> BatchLookups:
+    """Prefetch the DynamoDB state needed by the records of a batch.
+
+    Only results without the order breakdown need reads. Their PaymentEvent
+    items are fetched with one BatchGetItem and their GSI queries run
+    concurrently. Lookups that fail here are simply not cached, the record
+    handler then reads them itself. Checkouts whose orders span more than
+    one page are streamed page by page by the record handler, starting after
+    the first page read here.
+    """
+    lookups = BatchLookups()
+    checkout_ids: List[str] = []
+    for record in records:
+        try:
+            data = codec.loads(record.get("body") or "{}")
+        except (TypeError, ValueError):
+            continue
+        if isinstance(data, dict) and data.get("orders") is None and data.get("checkout_id") and data["checkout_id"] not in checkout_ids:
+            checkout_ids.append(data["checkout_id"])
+
+    if not checkout_ids:
+        return lookups
+
+    try:
+        lookups.payment_events.update(batch_get_payment_events(checkout_ids))
+    except (ClientError, BotoCoreError) as err:
+        logger.warning("PaymentEvent prefetch failed", error_type=type(err).__name__, error=str(err))
+
+    with ThreadPoolExecutor(max_workers=min(PREFETCH_CONCURRENCY, len(checkout_ids))) as pool:
+        futures = {checkout_id: pool.submit(query_payment_orders, checkout_id) for checkout_id in checkout_ids}
+
+    for checkout_id, future in futures.items():
+        try:
+            payment_orders, last_key = future.result()
+        except (ClientError, BotoCoreError) as err:
+            logger.warning("PaymentOrder prefetch failed", checkout_id=checkout_id, error_type=type(err).__name__)
+            continue
+        if last_key:
+            lookups.first_pages[checkout_id] = (payment_orders, last_key)
+        else:
+            lookups.payment_orders[checkout_id] = payment_orders
+
+    return lookups
+
+def load_seller_mapping(message: PaymentResultMessage, lookups: BatchLookups) -> Dict[str, str]:
+    """payment_order_id -> seller_account from the checkout's PaymentEvent item."""
+    if message.checkout_id in lookups.payment_events:
+        item = lookups.payment_events[message.checkout_id]
+        payment_event = {"Item": item} if item is not None else {}
+    else:
+        payment_event = payment_event_table.get_item(Key={"checkout_id": message.checkout_id})
+    if message.status == "SUCCESS" and "Item" not in payment_event:
+        raise ValueError(f"Payment event not found: {message.checkout_id}")
+
+    seller_info = payment_event.get("Item", {}).get("seller_info", {})
+    return codec.loads(seller_info) if isinstance(seller_info, str) else seller_info
+
+def attach_sellers(message: PaymentResultMessage, payment_orders: List[Dict[str, Any]], seller_mapping: Dict[str, str]) -> List[Dict[str, Any]]:
+    orders = []
+    for order in payment_orders:
+        payment_order_id = order["payment_order_id"]
+        seller_account = seller_mapping.get(payment_order_id)
+
+        if not seller_account:
+            if message.status == "SUCCESS":
+                raise ValueError(f"Missing seller_account for payment_order {payment_order_id}")
+            seller_account = "UNKNOWN"
+
+        orders.append({**order, "seller_account": seller_account})
+    return orders
+
+def load_payment_orders(message: PaymentResultMessage, lookups: BatchLookups) -> List[Dict[str, Any]]:
+    """Orders of a checkout prefetched as a single page, with their sellers.
+
+    Used for results that do not carry the order breakdown (schema version 1).
+    """
+    payment_orders = lookups.payment_orders[message.checkout_id]
+    if not payment_orders:
+        return []
+    return attach_sellers(message, payment_orders, load_seller_mapping(message, lookups))
+
+def fail_payment_orders(message: PaymentResultMessage, orders: List[Dict[str, Any]]) -> None:
+    for order in orders:
+        payment_order_id = order["payment_order_id"]
+
+        payment_order_table.update_item(
+            Key={"payment_order_id": payment_order_id},
+            UpdateExpression="SET payment_order_status = :status",
+            ExpressionAttributeValues={":status": "FAILED"}
+        )
+
+        log_business_event(
+            msg="Payment order failed",
+            event_type="payment.order.failed",
+            checkout_id=message.checkout_id,
+            outcome="FAILURE",
+            stage="SETTLEMENT",
+            data={
+                "payment_order.id": payment_order_id,
+                "amount.total": order["amount"],
+                "amount.currency": order["currency"],
+                "merchant.id": order["seller_account"],
+                "error.code": message.error_code or "PSP_ERROR",
+                "error.category": "PSP"
+            }
+        )
+
+def stream_payment_result(message: PaymentResultMessage, lookups: BatchLookups) -> Dict[str, Any]:
+    """Settle a schema version 1 result page by page from the checkout_id-index.
+
+    SUCCESS pages are credited and marked settled in their own transactions
+    as they are read, with the is_payment_done flag in the last page's
+    chunk; FAILED orders are marked page by page. Only a running total and
+    order count are kept. A redelivery after a partial run reads the pages
+    again and apply_settlement_chunk skips whatever its condition checks
+    find already written, so settlement resumes where it stopped. That is
+    also how a checkout cut short by the invocation deadline is finished.
+    """
+    seller_mapping: Optional[Dict[str, str]] = None
+    order_count = 0
+    amount_total = Decimal("0")
+    currency = None
+    checkout_settled = False
+
+    for page, is_last in iter_payment_order_pages(message.checkout_id, lookups.first_pages.get(message.checkout_id)):
+        if order_count:
+            batch_processor.check_deadline(f"the next order page of {message.checkout_id}")
+        if seller_mapping is None:
+            seller_mapping = load_seller_mapping(message, lookups)
+        orders = attach_sellers(message, page, seller_mapping)
+        order_count += len(orders)
+        amount_total += sum(Decimal(str(order["amount"])) for order in orders)
+        currency = currency or orders[0]["currency"]
+
+        if message.status == "SUCCESS":
+            settlement = {"checkout_id": message.checkout_id, "orders": orders, "final": is_last}
+            for chunk in build_settlement_chunks([settlement]):
+                failed = apply_settlement_chunk(chunk)
+                if failed:
+                    raise failed[message.checkout_id]
+                log_settled_orders(chunk)
+                checkout_settled = checkout_settled or bool(chunk["events"])
+        elif message.status == "FAILED":
+            fail_payment_orders(message, orders)
+
+    if not order_count:
+        logger.warning("No payment orders found", checkout_id=message.checkout_id)
+    if checkout_settled:
+        log_checkout_settled(message.checkout_id, amount_total, currency, order_count)
+    return {
+        "checkout_id": message.checkout_id,
+        "status": message.status,
+        "processed_orders": order_count
+    }
+
+def process_payment_result(message: PaymentResultMessage, lookups: Optional[BatchLookups] = None) -> Dict[str, Any]:
+    """Resolve the orders of a payment result.
+
+    Results that carry the order breakdown are handled without any DynamoDB
+    read. FAILED results are written straight away. For SUCCESS results the
+    orders to credit are returned under "orders" and settled for the whole
+    batch by settle_wallets. Results whose orders were not prefetched as a
+    single page are settled by stream_payment_result instead.
+    """
     simulate_error(message.simulate)
+    lookups = lookups or BatchLookups()
     
     try:
-        response = payment_order_table.query(
-            IndexName="checkout_id-index",
-            KeyConditionExpression="checkout_id = :checkout_id",
-            ExpressionAttributeValues={":checkout_id": message.checkout_id}
-        )
-        payment_orders = response.get("Items", [])
+        if message.orders is not None:
+            payment_orders = [order.model_dump() for order in message.orders]
+        elif message.checkout_id in lookups.payment_orders:
+            payment_orders = load_payment_orders(message, lookups)
+        else:
+            return stream_payment_result(message, lookups)
         
         if not payment_orders:
             logger.warning("No payment orders found", checkout_id=message.checkout_id)
@@ -75,103 +349,15 @@ def process_payment_result(message: PaymentResultMessage) -> Dict[str, Any]:
             }
         
         if message.status == "SUCCESS":
-            payment_event = payment_event_table.get_item(Key={"checkout_id": message.checkout_id})
-            if "Item" not in payment_event:
-                raise ValueError(f"Payment event not found: {message.checkout_id}")
-            
-            seller_info = payment_event["Item"].get("seller_info", {})
-            seller_mapping = json.loads(seller_info) if isinstance(seller_info, str) else seller_info
-            
-            for order in payment_orders:
-                payment_order_id = order["payment_order_id"]
-                seller_account = seller_mapping.get(payment_order_id)
-                
-                if not seller_account:
-                    raise ValueError(f"Missing seller_account for payment_order {payment_order_id}")
-                
-                wallet_table.update_item(
-                    Key={"merchant_id": seller_account},
-                    UpdateExpression="ADD balance :amount SET currency = :currency, updated_at = :timestamp",
-                    ExpressionAttributeValues={
-                        ":amount": Decimal(str(order["amount"])),
-                        ":currency": order["currency"],
-                        ":timestamp": Decimal(str(time.time()))
-                    }
-                )
-                
-                payment_order_table.update_item(
-                    Key={"payment_order_id": payment_order_id},
-                    UpdateExpression="SET payment_order_status = :status, wallet_updated = :wallet_updated",
-                    ExpressionAttributeValues={
-                        ":status": "SUCCESS",
-                        ":wallet_updated": True
-                    }
-                )
-
-                log_business_event(
-                    msg="Payment order settled",
-                    event_type="payment.order.settled",
-                    checkout_id=message.checkout_id,
-                    outcome="SUCCESS",
-                    stage="SETTLEMENT",
-                    data={
-                        "payment_order.id": payment_order_id,
-                        "amount.total": order["amount"],
-                        "amount.currency": order["currency"],
-                        "merchant.id": seller_account
-                    }
-                )
-            
-            payment_event_table.update_item(
-                Key={"checkout_id": message.checkout_id},
-                UpdateExpression="SET is_payment_done = :done",
-                ExpressionAttributeValues={":done": True}
-            )
-
-            log_business_event(
-                msg="Payment checkout settled",
-                event_type="payment.checkout.settled",
-                checkout_id=message.checkout_id,
-                outcome="SUCCESS",
-                stage="SETTLEMENT",
-                data={
-                    "amount.total": sum(Decimal(str(order["amount"])) for order in payment_orders),
-                    "amount.currency": payment_orders[0]["currency"] if payment_orders else "USD",
-                    "order.count": len(payment_orders)
-                }
-            )
+            return {
+                "checkout_id": message.checkout_id,
+                "status": message.status,
+                "processed_orders": len(payment_orders),
+                "orders": payment_orders
+            }
             
         elif message.status == "FAILED":
-            payment_event_response = payment_event_table.get_item(Key={"checkout_id": message.checkout_id})
-            payment_event_item = payment_event_response.get("Item", {})
-            seller_info = payment_event_item.get("seller_info", {})
-            seller_mapping = json.loads(seller_info) if isinstance(seller_info, str) else seller_info
-            
-            for order in payment_orders:
-                payment_order_id = order["payment_order_id"]
-                seller_account = seller_mapping.get(payment_order_id, "UNKNOWN")
-                
-                payment_order_table.update_item(
-                    Key={"payment_order_id": payment_order_id},
-                    UpdateExpression="SET payment_order_status = :status",
-                    ExpressionAttributeValues={":status": "FAILED"}
-                )
-                
-                log_business_event(
-                    msg="Payment order failed",
-                    event_type="payment.order.failed",
-                    checkout_id=message.checkout_id,
-                    outcome="FAILURE",
-                    stage="SETTLEMENT",
-                    data={
-                        "payment_order.id": payment_order_id,
-                        "amount.total": order["amount"],
-                        "amount.currency": order["currency"],
-                        "merchant.id": seller_account,
-                        "error.code": message.error_code or "PSP_ERROR",
-                        "error.category": "PSP"
-                    }
-                )
+            fail_payment_orders(message, payment_orders)
         
         return {
             "checkout_id": message.checkout_id,
@@ -186,23 +372,389 @@ def process_payment_result(message: PaymentResultMessage) -> Dict[str, Any]:
         logger.exception("Data integrity error", error_type=type(err).__name__)
         raise
 
-def record_handler(record: Dict[str, Any]) -> None:
+def build_settlement_chunks(settlements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Pack the orders of SUCCESS settlements into TransactWriteItems chunks.
+
+    A chunk holds at most TRANSACT_ITEM_LIMIT items: one coalesced wallet
+    credit per merchant, one status transition per order and the
+    is_payment_done flag of every checkout whose last order it contains. A
+    checkout stays in a single chunk whenever it fits, and a merchant is
+    credited in one currency per chunk since a transaction cannot touch the
+    same item twice. A settlement with "final" set to False is one page of a
+    larger checkout: its orders are packed but not the is_payment_done flag.
+    """
+    chunks: List[Dict[str, Any]] = []
+    chunk = {"orders": [], "events": [], "merchants": {}}
+
+    def size(current: Dict[str, Any]) -> int:
+        return len(current["orders"]) + len(current["events"]) + len(current["merchants"])
+
+    for settlement in settlements:
+        orders = settlement["orders"]
+        final = settlement.get("final", True)
+        merchants = {order["seller_account"] for order in orders}
+        needed = len(orders) + 1 + len(merchants - chunk["merchants"].keys())
+        if chunk["orders"] and size(chunk) + needed > TRANSACT_ITEM_LIMIT and len(orders) + 1 + len(merchants) <= TRANSACT_ITEM_LIMIT:
+            chunks.append(chunk)
+            chunk = {"orders": [], "events": [], "merchants": {}}
+
+        for index, order in enumerate(orders):
+            merchant_id = order["seller_account"]
+            is_last = final and index == len(orders) - 1
+            needed = 1 + (merchant_id not in chunk["merchants"]) + is_last
+            currency_conflict = chunk["merchants"].get(merchant_id, order["currency"]) != order["currency"]
+            if chunk["orders"] and (currency_conflict or size(chunk) + needed > TRANSACT_ITEM_LIMIT):
+                chunks.append(chunk)
+                chunk = {"orders": [], "events": [], "merchants": {}}
+
+            chunk["merchants"][merchant_id] = order["currency"]
+            chunk["orders"].append((settlement["checkout_id"], order))
+            if is_last:
+                chunk["events"].append(settlement["checkout_id"])
+
+    if chunk["orders"]:
+        chunks.append(chunk)
+    return chunks
+
+def wallet_shard_key(merchant_id: str, shard: int) -> str:
+    return merchant_id if shard == 0 else f"{merchant_id}#{shard}"
+
+def pick_wallet_shard(merchant_id: str) -> str:
+    """Wallet item key that receives the next credit of a merchant."""
+    shard_count = WALLET_SHARD_COUNTS.get(merchant_id, 1)
+    return wallet_shard_key(merchant_id, random.randrange(shard_count)) if shard_count > 1 else merchant_id
+
+def build_transact_items(chunk: Dict[str, Any]) -> List[Tuple[str, Any, Dict[str, Any]]]:
+    """Return (kind, key, TransactItem) triples for a settlement chunk."""
+    timestamp = Decimal(str(time.time()))
+    credits: Dict[str, Dict[str, Any]] = {}
+    for _, order in chunk["orders"]:
+        credit = credits.setdefault(order["seller_account"], {"currency": order["currency"], "amount": Decimal("0")})
+        credit["amount"] += Decimal(str(order["amount"]))
+
+    items = [
+        ("wallet", merchant_id, {"Update": {
+            "TableName": WALLET_TABLE,
+            "Key": {"merchant_id": pick_wallet_shard(merchant_id)},
+            "UpdateExpression": "ADD balance :amount SET currency = :currency, updated_at = :timestamp",
+            "ExpressionAttributeValues": {
+                ":amount": credit["amount"],
+                ":currency": credit["currency"],
+                ":timestamp": timestamp
+            }
+        }})
+        for merchant_id, credit in credits.items()
+    ]
+    items += [
+        ("order", order["payment_order_id"], {"Update": {
+            "TableName": PAYMENT_ORDER_TABLE,
+            "Key": {"payment_order_id": order["payment_order_id"]},
+            "UpdateExpression": "SET payment_order_status = :status, wallet_updated = :wallet_updated",
+            "ConditionExpression": "attribute_exists(payment_order_id) AND payment_order_status <> :status",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+            "ExpressionAttributeValues": {
+                ":status": "SUCCESS",
+                ":wallet_updated": True
+            }
+        }})
+        for _, order in chunk["orders"]
+    ]
+    items += [
+        ("event", checkout_id, {"Update": {
+            "TableName": PAYMENT_EVENT_TABLE,
+            "Key": {"checkout_id": checkout_id},
+            "UpdateExpression": "SET is_payment_done = :done",
+            "ConditionExpression": "attribute_exists(checkout_id) AND is_payment_done <> :done",
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+            "ExpressionAttributeValues": {":done": True}
+        }})
+        for checkout_id in chunk["events"]
+    ]
+    return items
+
+def is_settled(kind: str, item: Optional[Dict[str, Any]]) -> bool:
+    """Whether the item returned with a failed condition check is already settled."""
+    if not item:
+        return False
+    if kind == "order":
+        return item.get("payment_order_status", {}).get("S") == "SUCCESS"
+    return item.get("is_payment_done", {}).get("BOOL") is True
+
+def apply_settlement_chunk(chunk: Dict[str, Any]) -> Dict[str, Exception]:
+    """Apply a settlement chunk in one TransactWriteItems call.
+
+    Items rejected by their condition that are already settled were applied
+    by an earlier delivery of the same message: they are dropped from the
+    chunk and the rest is retried, so a replayed message never credits a
+    wallet twice. A checkout with an item that does not exist, or that the
+    cancellation reasons blame otherwise, is dropped from the chunk the same
+    way. Returns the dropped checkouts with the error to fail their records
+    with (also kept under chunk["failed"]). ClientErrors that cannot be
+    pinned to a checkout, e.g. on a Wallet item, are raised. On return the
+    chunk only holds the orders and events written by this call.
+    """
+    failed: Dict[str, Exception] = chunk.setdefault("failed", {})
+    while chunk["orders"] or chunk["events"]:
+        items = build_transact_items(chunk)
+        try:
+            dynamodb_client.transact_write_items(TransactItems=[item for _, _, item in items])
+            return failed
+        except ClientError as err:
+            error = err
+            reasons = err.response.get("CancellationReasons") or []
+            if err.response["Error"]["Code"] != "TransactionCanceledException" or not reasons:
+                raise
+
+        checkout_of_order = {order["payment_order_id"]: checkout_id for checkout_id, order in chunk["orders"]}
+        settled = set()
+        dropped = set()
+        for (kind, key, _), reason in zip(items, reasons):
+            code = reason.get("Code")
+            if code in (None, "None"):
+                continue
+            if kind == "wallet":
+                raise error
+            if code == "ConditionalCheckFailed" and is_settled(kind, reason.get("Item")):
+                settled.add((kind, key))
+                continue
+            checkout_id = checkout_of_order[key] if kind == "order" else key
+            dropped.add(checkout_id)
+            if code == "ConditionalCheckFailed":
+                failed.setdefault(checkout_id, ValueError(f"Payment {kind} not found: {key}"))
+            else:
+                failed.setdefault(checkout_id, RuntimeError(f"Database operation failed: {code} on payment {kind} {key}"))
+        if not settled and not dropped:
+            raise error
+        if settled:
+            logger.info("Skipping already settled items", settled_items=sorted(f"{kind}:{key}" for kind, key in settled))
+        if dropped:
+            logger.error("Dropping checkouts from the settlement transaction", checkout_ids=sorted(dropped),
+                reasons=sorted({str(failed[checkout_id]) for checkout_id in dropped}))
+        chunk["orders"] = [
+            (checkout_id, order) for checkout_id, order in chunk["orders"]
+            if ("order", order["payment_order_id"]) not in settled and checkout_id not in failed
+        ]
+        chunk["events"] = [checkout_id for checkout_id in chunk["events"] if ("event", checkout_id) not in settled and checkout_id not in failed]
+    return failed
+
+def split_settlement_chunk(chunk: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """One chunk per checkout of a chunk, for settling them one transaction each."""
+    chunks: Dict[str, Dict[str, Any]] = {}
+    for checkout_id, order in chunk["orders"]:
+        chunks.setdefault(checkout_id, {"orders": [], "events": []})["orders"].append((checkout_id, order))
+    for checkout_id in chunk["events"]:
+        chunks.setdefault(checkout_id, {"orders": [], "events": []})["events"].append(checkout_id)
+    return list(chunks.items())
+
+def log_settled_orders(chunk: Dict[str, Any]) -> None:
+    for checkout_id, order in chunk["orders"]:
+        log_business_event(
+            msg="Payment order settled",
+            event_type="payment.order.settled",
+            checkout_id=checkout_id,
+            outcome="SUCCESS",
+            stage="SETTLEMENT",
+            data={
+                "payment_order.id": order["payment_order_id"],
+                "amount.total": order["amount"],
+                "amount.currency": order["currency"],
+                "merchant.id": order["seller_account"]
+            }
+        )
+
+def log_checkout_settled(checkout_id: str, amount_total: Decimal, currency: Optional[str], order_count: int) -> None:
+    log_business_event(
+        msg="Payment checkout settled",
+        event_type="payment.checkout.settled",
+        checkout_id=checkout_id,
+        outcome="SUCCESS",
+        stage="SETTLEMENT",
+        data={
+            "amount.total": amount_total,
+            "amount.currency": currency or "USD",
+            "order.count": order_count
+        }
+    )
+
+def settle_wallets(processed: List[tuple]) -> None:
+    """Settle every SUCCESS result of the batch with TransactWriteItems.
+
+    Wallet credits (summed per merchant), PaymentOrder status transitions and
+    the PaymentEvent.is_payment_done flags are written atomically, usually in
+    a single request for the whole batch. A checkout the cancellation reasons
+    blame, e.g. for a missing PaymentEvent or PaymentOrder, is dropped from
+    its chunk and only its records fail. When a chunk fails in a way that
+    cannot be pinned to a checkout, its checkouts are settled one
+    transaction each, so only those that fail again are reported as batch
+    item failures. Checkouts not started before the invocation deadline
+    fail without being written.
+    """
+    pending = [(record, result) for status, result, record in processed if status == "success" and result and result.get("orders")]
+
+    settlements: Dict[str, Dict[str, Any]] = {}
+    records_by_checkout: Dict[str, List[Dict[str, Any]]] = {}
+    for record, settlement in pending:
+        settlements.setdefault(settlement["checkout_id"], settlement)
+        records_by_checkout.setdefault(settlement["checkout_id"], []).append(record)
+
+    def log_chunk_settled(chunk: Dict[str, Any]) -> None:
+        log_settled_orders(chunk)
+        for checkout_id in chunk["events"]:
+            orders = settlements[checkout_id]["orders"]
+            log_checkout_settled(
+                checkout_id,
+                sum(Decimal(str(order["amount"])) for order in orders),
+                orders[0]["currency"] if orders else None,
+                len(orders)
+            )
+
+    failures: Dict[str, Exception] = {}
+    for chunk in build_settlement_chunks(list(settlements.values())):
+        checkout_ids = {checkout_id for checkout_id, _ in chunk["orders"]} | set(chunk["events"])
+        try:
+            batch_processor.check_deadline("the settlement transaction")
+        except DeadlineExceededError as err:
+            logger.warning("Settlement transaction skipped", reason=str(err), checkout_ids=sorted(checkout_ids))
+            for checkout_id in checkout_ids:
+                failures[checkout_id] = err
+            continue
+        try:
+            failures.update(apply_settlement_chunk(chunk))
+        except ClientError as err:
+            logger.warning("Settlement transaction failed, settling its checkouts one by one",
+                error_type=type(err).__name__,
+                error=str(err),
+                checkout_ids=sorted(checkout_ids)
+            )
+            failures.update(chunk["failed"])
+            for checkout_id, checkout_chunk in split_settlement_chunk(chunk):
+                try:
+                    batch_processor.check_deadline("the settlement transaction")
+                    failures.update(apply_settlement_chunk(checkout_chunk))
+                except DeadlineExceededError as err:
+                    failures[checkout_id] = err
+                    continue
+                except ClientError as err:
+                    logger.exception("Settlement transaction failed",
+                        error_type=type(err).__name__,
+                        checkout_ids=[checkout_id]
+                    )
+                    failures[checkout_id] = RuntimeError(f"Database operation failed: {err}")
+                    continue
+                log_chunk_settled(checkout_chunk)
+            continue
+
+        log_chunk_settled(chunk)
+
+    for checkout_id, err in failures.items():
+        for record in records_by_checkout[checkout_id]:
+            batch_processor.fail_record(record, err)
+
+def read_wallet_shards(merchant_id: str) -> List[Dict[str, Any]]:
+    """Read every Wallet item of a merchant with a consistent BatchGetItem."""
+    keys = [{"merchant_id": wallet_shard_key(merchant_id, shard)} for shard in range(WALLET_SHARD_COUNTS.get(merchant_id, 1))]
+    request = {WALLET_TABLE: {"Keys": keys, "ConsistentRead": True}}
+    items: List[Dict[str, Any]] = []
+    for attempt in range(PREFETCH_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(random.uniform(0, min(1.0, 0.05 * (2 ** attempt))))
+        response = dynamodb_client.batch_get_item(RequestItems=request)
+        items += response.get("Responses", {}).get(WALLET_TABLE, [])
+        request = response.get("UnprocessedKeys") or {}
+        if not request:
+            return items
+    raise RuntimeError(f"Wallet shards of {merchant_id} left unprocessed")
+
+def get_wallet_balance(merchant_id: str) -> Dict[str, Any]:
+    """Balance of a merchant, summed over its Wallet shards."""
+    items = read_wallet_shards(merchant_id)
+    return {
+        "merchant_id": merchant_id,
+        "balance": sum((Decimal(str(item.get("balance", 0))) for item in items), Decimal("0")),
+        "currency": next((item["currency"] for item in items if item.get("currency")), None),
+        "shards": len(items),
+    }
+
+def compact_wallet_shards(merchant_id: str) -> Decimal:
+    """Fold the balances of a merchant's shards n > 0 back into its own item.
+
+    Each shard is zeroed on the condition that its balance is still the one
+    read, in the same transaction that credits the merchant item, so the
+    total never changes. A shard credited in between cancels the transaction
+    and is picked up by the next run. Returns the amount moved.
+    """
+    shards = [
+        item for item in read_wallet_shards(merchant_id)
+        if item["merchant_id"] != merchant_id and Decimal(str(item.get("balance", 0))) != 0
+    ]
+    if not shards:
+        return Decimal("0")
+
+    moved = sum(Decimal(str(item["balance"])) for item in shards)
+    timestamp = Decimal(str(time.time()))
+    transact_items = [{"Update": {
+        "TableName": WALLET_TABLE,
+        "Key": {"merchant_id": merchant_id},
+        "UpdateExpression": "ADD balance :amount SET currency = :currency, updated_at = :timestamp",
+        "ExpressionAttributeValues": {":amount": moved, ":currency": shards[0]["currency"], ":timestamp": timestamp}
+    }}]
+    transact_items += [{"Update": {
+        "TableName": WALLET_TABLE,
+        "Key": {"merchant_id": item["merchant_id"]},
+        "UpdateExpression": "SET balance = :zero, updated_at = :timestamp",
+        "ConditionExpression": "balance = :balance",
+        "ExpressionAttributeValues": {":zero": Decimal("0"), ":balance": item["balance"], ":timestamp": timestamp}
+    }} for item in shards]
+    dynamodb_client.transact_write_items(TransactItems=transact_items)
+    return moved
+
+def handle_wallet_action(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle direct invocations used for balance reads and shard compaction.
+
+    {"action": "get_balance", "merchant_id": ...} returns the summed balance;
+    {"action": "compact_shards", "merchant_ids": [...]} folds shards back,
+    for every merchant in WALLET_SHARD_COUNTS when merchant_ids is omitted.
+    """
+    action = event["action"]
+    if action == "get_balance":
+        balance = get_wallet_balance(event["merchant_id"])
+        return {**balance, "balance": str(balance["balance"])}
+
+    if action == "compact_shards":
+        compacted, failed = {}, []
+        for merchant_id in event.get("merchant_ids") or list(WALLET_SHARD_COUNTS):
+            try:
+                compacted[merchant_id] = str(compact_wallet_shards(merchant_id))
+            except (ClientError, RuntimeError) as err:
+                logger.warning("Wallet shard compaction failed", merchant_id=merchant_id, error_type=type(err).__name__, error=str(err))
+                failed.append(merchant_id)
+        logger.info("Wallet shards compacted", compacted=compacted, failed=failed)
+        return {"compacted": compacted, "failed": failed}
+
+    raise ValueError(f"Unknown wallet action: {action}")
+
+def record_handler(record: Dict[str, Any], lookups: Optional[BatchLookups] = None) -> Dict[str, Any]:
     message_body = record.get("body", "{}")
-    data = json.loads(message_body) if isinstance(message_body, str) else message_body
-    payment_result = PaymentResultMessage.model_validate(data)
+    if isinstance(message_body, str):
+        payment_result = PaymentResultMessage.model_validate_json(message_body)
+    else:
+        payment_result = PaymentResultMessage.model_validate(message_body)
         
     if payment_result.simulate:
         logger.info("Simulate config received from SQS", simulate_config=payment_result.simulate)
     
-    process_payment_result(payment_result)
+    return process_payment_result(payment_result, lookups)
 
-batch_processor = BatchProcessor(event_type=EventType.SQS)
+batch_processor = ConcurrentBatchProcessor(event_type=EventType.SQS, deadline_margin_ms=DEADLINE_MARGIN_MS)
 
 @logger.inject_lambda_context
 def handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
-    return process_partial_response(
-        event=event,
-        record_handler=record_handler,
-        processor=batch_processor,
-        context=context
-    )
+    if "action" in event:
+        return handle_wallet_action(event)
+
+    records = event_records(event)
+    lookups = prefetch_lookups(records)
+    with batch_processor(records, functools.partial(record_handler, lookups=lookups), context):
+        processed = batch_processor.process()
+        settle_wallets(processed)
+    return batch_processor.response()
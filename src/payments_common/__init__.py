@@ -0,0 +1 @@
+"""Helpers shared by the payment Lambdas and packaged into every Lambda zip."""
@@ -0,0 +1,110 @@
+import contextvars
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType
+from aws_lambda_powertools.utilities.batch.exceptions import UnexpectedBatchTypeError
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceededError(RuntimeError):
+    """Too little of the invocation is left to do the work; SQS redelivers the record."""
+
+
+def event_records(event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The event's Records, rejected like process_partial_response does when missing or not a list."""
+    records = event.get("Records")
+    if not records or not isinstance(records, list):
+        raise UnexpectedBatchTypeError("Unexpected batch event type, expected an SQS event with a Records list")
+    return records
+
+
+class ConcurrentBatchProcessor(BatchProcessor):
+    """BatchProcessor that runs the record handler on a bounded thread pool.
+
+    Each record runs in a copy of the caller's context so spans opened by the
+    handler stay children of the invocation span. Failed records are reported
+    in the original batch order, same as the sequential processor.
+
+    With deadline_margin_ms set, records are no longer started once less than
+    that is left of the invocation; they are reported as batch item failures
+    so only they are redelivered, instead of the whole batch after a timeout.
+    Handlers can size their own timeouts with remaining_ms().
+    """
+
+    def __init__(self, event_type: EventType, max_concurrency: int = 1, deadline_margin_ms: float = 0, **kwargs):
+        super().__init__(event_type=event_type, **kwargs)
+        self.max_concurrency = max_concurrency
+        self.deadline_margin_ms = deadline_margin_ms
+        self._deadline_context = None
+
+    def __call__(self, records: list, handler, lambda_context=None):
+        self._deadline_context = lambda_context
+        return super().__call__(records, handler, lambda_context)
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self._deadline_context = None
+        return super().__exit__(exception_type, exception_value, traceback)
+
+    def remaining_ms(self) -> Optional[float]:
+        """Milliseconds left before the deadline margin, None outside a deadline-aware invocation."""
+        if not self.deadline_margin_ms or self._deadline_context is None:
+            return None
+        return self._deadline_context.get_remaining_time_in_millis() - self.deadline_margin_ms
+
+    def check_deadline(self, work: str) -> None:
+        remaining = self.remaining_ms()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(f"Not starting {work}: less than {self.deadline_margin_ms:.0f} ms of the invocation left")
+
+    def _process_record(self, record: Dict[str, Any]):
+        try:
+            self.check_deadline("record")
+        except DeadlineExceededError as err:
+            logger.warning("Skipping record %s: %s", record.get("messageId"), err)
+            return self.failure_handler(
+                record=self._to_batch_type(record=record, event_type=self.event_type, model=self.model),
+                exception=(type(err), err, err.__traceback__)
+            )
+        return super()._process_record(record)
+
+    def process(self) -> list:
+        if self.max_concurrency <= 1 or len(self.records) <= 1:
+            return super().process()
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(self.records))) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._process_record, record)
+                for record in self.records
+            ]
+            results = [future.result() for future in futures]
+
+        self._sort_failures()
+        return results
+
+    def _sort_failures(self) -> None:
+        order = {record.get("messageId"): index for index, record in enumerate(self.records)}
+        self.fail_messages.sort(key=lambda msg: order.get(msg.message_id, len(order)))
+
+    def fail_record(self, record: Dict[str, Any], exception: Exception) -> None:
+        """Report a record that was handled successfully as a batch item failure.
+
+        An exception that was never raised is raised here first, so the
+        failure carries a traceback. Failures stay in batch order.
+        """
+        self.success_messages.remove(record)
+        if exception.__traceback__ is None:
+            try:
+                raise exception
+            except Exception:
+                exc_info = sys.exc_info()
+        else:
+            exc_info = (type(exception), exception, exception.__traceback__)
+        self.failure_handler(
+            record=self._to_batch_type(record=record, event_type=self.event_type, model=self.model),
+            exception=exc_info
+        )
+        self._sort_failures()
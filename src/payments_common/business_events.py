@@ -0,0 +1,69 @@
+import logging
+import math
+import os
+import random
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from aws_lambda_powertools import Logger
+
+logger = logging.getLogger(__name__)
+
+# comma separated event_type=rate pairs, e.g. "payment.order.settled=0.1"
+BUSINESS_EVENTS_SAMPLE_RATES = os.environ.get("BUSINESS_EVENTS_SAMPLE_RATES", "")
+
+# failures are always kept so error rates and alerts stay exact
+UNSAMPLED_OUTCOMES = {"FAILURE", "REJECTED"}
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse BUSINESS_EVENTS_SAMPLE_RATES; malformed entries are logged and leave the event type unsampled."""
+    rates = {}
+    for pair in filter(None, (part.strip() for part in value.split(","))):
+        event_type, _, rate = pair.partition("=")
+        event_type = event_type.strip()
+        try:
+            rate = float(rate)
+        except ValueError:
+            rate = None
+        if not event_type or rate is None or math.isnan(rate):
+            logger.error("Invalid BUSINESS_EVENTS_SAMPLE_RATES entry %r, keeping every event", pair)
+            continue
+        rates[event_type] = min(1.0, max(0.0, rate))
+    return rates
+
+
+class BusinessEventEmitter:
+    """Structured Business Event logging for Dynatrace extraction.
+
+    Events keep the fields of the original per-Lambda log_business_event.
+    High-volume success events can be sampled per event_type; kept events
+    then carry event_sample_rate so counts can be scaled back up. Failed and
+    rejected outcomes are always kept. Each event is written as one flat log
+    line as soon as it is emitted.
+    """
+
+    def __init__(self, logger: Logger, default_stage: str, sample_rates: Optional[Dict[str, float]] = None):
+        self.logger = logger
+        self.default_stage = default_stage
+        self.sample_rates = parse_sample_rates(BUSINESS_EVENTS_SAMPLE_RATES) if sample_rates is None else sample_rates
+
+    def emit(self, msg: str, event_type: str, checkout_id: str, outcome: str, stage: Optional[str] = None, data: dict = None) -> None:
+        rate = 1.0 if outcome in UNSAMPLED_OUTCOMES else self.sample_rates.get(event_type, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return
+
+        event = {
+            "event_type": event_type,
+            "event_provider": "payment-service",
+            "event_version": "1.0",
+            "biz_checkout_id": checkout_id,
+            "biz_timestamp": datetime.now(timezone.utc).isoformat(),
+            "outcome": outcome,
+            "stage": stage or self.default_stage,
+            **(data or {})
+        }
+        if rate < 1.0:
+            event["event_sample_rate"] = rate
+
+        self.logger.info(msg, **event)
@@ -0,0 +1,48 @@
+"""JSON encoding of API bodies and SQS messages.
+
+orjson is used when it is installed, as it is in every Lambda's
+requirements.txt; the stdlib json module otherwise (e.g. local runs). Both backends write
+compact JSON, serialize datetime, date and time values in ISO 8601,
+enums by value, Decimal and other non-JSON values as strings, and
+serialize pydantic models with model_dump_json, so the output does not
+depend on the backend.
+"""
+import datetime
+import json
+from enum import Enum
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so one except clause covers both backends
+JSONDecodeError = json.JSONDecodeError
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    # orjson writes these natively; the json fallback needs the same representation
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def dumps(value: Any) -> str:
+    if hasattr(value, "model_dump_json"):
+        return value.model_dump_json()
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, default=_default, separators=(",", ":"))
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
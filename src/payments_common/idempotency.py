@@ -0,0 +1,72 @@
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from payments_common.cache import TtlLruCache
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    """Outcome of a side effect keyed by an idempotency key.
+
+    Records are written to a DynamoDB table (hash key ``key_attribute``,
+    expiry in the ``expires_at`` TTL attribute) and kept in an in-memory
+    cache for the warm container. Without a table name the store is memory
+    only, which is the local stand-in used outside AWS. DynamoDB errors are
+    logged and treated as a miss so they never block the caller.
+    """
+
+    def __init__(self, client: Any = None, table_name: Optional[str] = None, key_attribute: str = "checkout_id",
+                 ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS, cache_size: int = IDEMPOTENCY_CACHE_SIZE):
+        self.client = client
+        self.table_name = table_name
+        self.key_attribute = key_attribute
+        self.ttl_seconds = ttl_seconds
+        self.cache = TtlLruCache(max_entries=cache_size, ttl_seconds=ttl_seconds)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if (record := self.cache.get(key)) is not None:
+            return record
+        if not self.table_name:
+            return None
+
+        try:
+            item = self.client.get_item(
+                TableName=self.table_name,
+                Key={self.key_attribute: key},
+                ConsistentRead=True
+            ).get("Item")
+        except ClientError as err:
+            logger.warning("Idempotency lookup failed for %s: %s", key, err)
+            return None
+
+        # TTL deletion lags expiry by up to a few days, so check it here too
+        if not item or int(item.get("expires_at", 0)) <= time.time():
+            return None
+        record = item["outcome"]
+        self.cache.put(key, record)
+        return record
+
+    def put(self, key: str, record: Dict[str, Any]) -> None:
+        self.cache.put(key, record)
+        if not self.table_name:
+            return
+
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    self.key_attribute: key,
+                    "outcome": record,
+                    "expires_at": int(time.time()) + self.ttl_seconds,
+                }
+            )
+        except ClientError as err:
+            logger.warning("Idempotency record not stored for %s: %s", key, err)
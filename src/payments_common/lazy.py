@@ -0,0 +1,58 @@
+import logging
+import os
+import threading
+from typing import Any, Callable, Optional
+
+LAZY_INIT = os.environ.get("LAZY_INIT", "true").lower() == "true"
+PRIME_CONNECTIONS = os.environ.get("PRIME_CONNECTIONS", "false").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+
+class LazyResource:
+    """Proxy that builds a boto3 client, resource or Table on first use.
+
+    Attribute access is forwarded to the real object, so call sites keep
+    using it as if it had been created at import time. An optional primer
+    issues a cheap request to open the connection ahead of the first
+    invocation.
+    """
+
+    def __init__(self, factory: Callable[[], Any], primer: Optional[Callable[[Any], Any]] = None):
+        self._factory = factory
+        self._primer = primer
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def prime(self) -> None:
+        instance = self.get()
+        if self._primer is None:
+            return
+        try:
+            self._primer(instance)
+        except Exception as err:
+            logger.warning("Connection priming failed: %s", err)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+
+def initialize(*resources: LazyResource) -> None:
+    """Apply LAZY_INIT / PRIME_CONNECTIONS to resources at import time.
+
+    With PRIME_CONNECTIONS the resources are built and their connections
+    opened while the init phase runs; with LAZY_INIT disabled they are built
+    eagerly as before; otherwise nothing happens until first use.
+    """
+    for resource in resources:
+        if PRIME_CONNECTIONS:
+            resource.prime()
+        elif not LAZY_INIT:
+            resource.get()
@@ -0,0 +1,176 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "o11y-payments")
+# also push the invocation's aggregates through the OTel SDK when the handler returns
+METRICS_OTLP_EXPORT = os.environ.get("METRICS_OTLP_EXPORT", "false").lower() == "true"
+METRICS_OTLP_FLUSH_TIMEOUT_MS = int(os.environ.get("METRICS_OTLP_FLUSH_TIMEOUT_MS", "1000"))
+
+# upper bounds in ms; EMF accepts at most 100 distinct values per metric
+HISTOGRAM_BOUNDARIES_MS = (5, 10, 25, 50, 75, 100, 150, 200, 250, 300, 400, 500, 750,
+                           1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 30000)
+# EMF accepts at most 100 metric definitions per document
+EMF_MAX_METRICS = 100
+
+logger = logging.getLogger(__name__)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def histogram_bucket(value: float) -> float:
+    index = bisect.bisect_left(HISTOGRAM_BOUNDARIES_MS, value)
+    if index < len(HISTOGRAM_BOUNDARIES_MS):
+        return HISTOGRAM_BOUNDARIES_MS[index]
+    return float(round(value, -3))
+
+
+class InvocationMetrics:
+    """Counters and histograms aggregated in memory for one invocation.
+
+    Recording only updates dictionaries under a lock, so it is safe from the
+    executor's worker threads and never touches the network. flush() writes
+    the invocation's metrics as CloudWatch Embedded Metric Format lines on
+    stdout, usually a single one, with the attributes as dimensions next to
+    service (payment.tpv by currency). Histograms are written as bucket
+    Values/Counts, which Powertools Metrics cannot express. With the OTLP export enabled,
+    observations are also recorded as they come into the OTel SDK
+    histogram, which aggregates them itself.
+    """
+
+    def __init__(self, service: str, namespace: str = METRICS_NAMESPACE, otlp_export: bool = METRICS_OTLP_EXPORT):
+        self.service = service
+        self.namespace = namespace
+        self.otlp_export = otlp_export
+        self._units: Dict[str, str] = {}
+        self._counters: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, Counter] = {}
+        self._lock = threading.Lock()
+        self._otel = None
+
+    def add(self, name: str, value: float = 1, unit: str = "Count", **attributes: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in attributes.items())))
+        with self._lock:
+            self._units[name] = unit
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value_ms: float, **attributes: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in attributes.items())))
+        bucket = histogram_bucket(value_ms)
+        with self._lock:
+            self._units[name] = "Milliseconds"
+            self._histograms.setdefault(key, Counter())[bucket] += 1
+        if self.otlp_export:
+            self._record_otlp(key, value_ms)
+
+    def build_emf(self, counters: Dict[MetricKey, float], histograms: Dict[MetricKey, Counter]) -> List[Dict[str, Any]]:
+        """Pack the metrics into as few EMF documents as their dimension values allow.
+
+        A document holds one value per root key, so two attribute sets that
+        give the same attribute different values (currency USD and EUR), or
+        the same metric under two attribute sets, go to separate documents.
+        Within a document each attribute-name set gets its own
+        CloudWatchMetrics directive.
+        """
+        timestamp = int(time.time() * 1000)
+        # (document, metric definitions by dimension names)
+        records: List[Tuple[Dict[str, Any], Dict[Tuple[str, ...], List[Dict[str, str]]]]] = []
+
+        def record_for(name: str, attributes: Tuple[Tuple[str, str], ...]) -> Dict[str, Any]:
+            for record, directives in records:
+                if (name not in record and sum(map(len, directives.values())) < EMF_MAX_METRICS
+                        and all(record.get(key, value) == value for key, value in attributes)):
+                    break
+            else:
+                record, directives = {"service": self.service}, {}
+                records.append((record, directives))
+            record.update(attributes)
+            directives.setdefault(tuple(key for key, _ in attributes), []).append({"Name": name, "Unit": self._units[name]})
+            return record
+
+        for (name, attributes), value in counters.items():
+            record_for(name, attributes)[name] = value
+        for (name, attributes), buckets in histograms.items():
+            record_for(name, attributes)[name] = {"Values": list(buckets.keys()), "Counts": list(buckets.values())}
+
+        for record, directives in records:
+            record["_aws"] = {
+                "Timestamp": timestamp,
+                "CloudWatchMetrics": [
+                    {"Namespace": self.namespace, "Dimensions": [["service", *keys]], "Metrics": metrics}
+                    for keys, metrics in directives.items()
+                ],
+            }
+        return [record for record, _ in records]
+
+    def flush(self) -> None:
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+        if not counters and not histograms:
+            return
+
+        print("\n".join(json.dumps(record) for record in self.build_emf(counters, histograms)), flush=True)
+        if self.otlp_export:
+            self._export_otlp(counters)
+
+    def _otel_instruments(self):
+        with self._lock:
+            if self._otel is None:
+                self._otel = self._create_otel()
+            return self._otel
+
+    def _create_otel(self):
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        from opentelemetry.sdk.metrics import Counter as OtelCounter, Histogram, MeterProvider
+        from opentelemetry.sdk.metrics.export import AggregationTemporality, PeriodicExportingMetricReader
+        from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+
+        exporter = OTLPMetricExporter(preferred_temporality={
+            OtelCounter: AggregationTemporality.DELTA,
+            Histogram: AggregationTemporality.DELTA,
+        })
+        # exported explicitly with force_flush, the periodic interval only acts as a fallback
+        reader = PeriodicExportingMetricReader(exporter=exporter, export_interval_millis=60000)
+        provider = MeterProvider(resource=Resource.create({SERVICE_NAME: self.service}), metric_readers=[reader])
+        return provider, provider.get_meter(self.service, "1.0.0"), {}
+
+    def _record_otlp(self, key: MetricKey, value_ms: float) -> None:
+        name, attributes = key
+        try:
+            _, meter, instruments = self._otel_instruments()
+            with self._lock:
+                if name not in instruments:
+                    instruments[name] = meter.create_histogram(name=name, unit="ms")
+            instruments[name].record(value_ms, attributes=dict(attributes))
+        except Exception as err:
+            logger.warning("OTLP histogram recording failed: %s", err)
+
+    def _export_otlp(self, counters: Dict[MetricKey, float]) -> None:
+        """Add the invocation's counters and flush them with the recorded histograms."""
+        try:
+            provider, meter, instruments = self._otel_instruments()
+            for (name, attributes), value in counters.items():
+                with self._lock:
+                    if name not in instruments:
+                        instruments[name] = meter.create_counter(name=name, unit=self._units[name])
+                instruments[name].add(value, attributes=dict(attributes))
+            provider.force_flush(timeout_millis=METRICS_OTLP_FLUSH_TIMEOUT_MS)
+        except Exception as err:
+            logger.warning("OTLP metrics export failed: %s", err)
+
+    def flush_after(self, handler: Callable) -> Callable:
+        """Decorate a Lambda handler so the invocation's metrics are written when it returns."""
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            try:
+                return handler(event, context)
+            finally:
+                self.flush()
+        return wrapper
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Rolling error-rate circuit breaker for calls to a dependency.
+
+    Closed: calls go through and their outcomes are kept for window_seconds;
+    once at least min_calls are in the window and the failure share reaches
+    failure_rate, the breaker opens. Open: allow() refuses every call for
+    open_seconds. Half-open: up to half_open_calls probes are let through,
+    the first probe to succeed closes the breaker and a failed one opens it
+    again. allow() returns a ticket for the admitted call, or None, and
+    record() takes it back: results of calls admitted before the last state
+    change are ignored, so a slow call from the closed period cannot decide
+    the half-open state. State lives at module scope, so it carries over
+    warm invocations of the container.
+    """
+
+    def __init__(self, failure_rate: float = 0.5, min_calls: int = 10, window_seconds: float = 30,
+                 open_seconds: float = 15, half_open_calls: int = 1,
+                 on_state_change: Optional[Callable[[str, str, float], None]] = None):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.on_state_change = on_state_change
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # counts state changes, handed out by allow() as the call's ticket
+        self._generation = 0
+        # (monotonic time, failed) per call
+        self._outcomes: deque = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def failure_share(self) -> float:
+        with self._lock:
+            self._trim(time.monotonic())
+            return sum(failed for _, failed in self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _transition(self, state: str, failure_share: float) -> None:
+        previous, self._state = self._state, state
+        self._generation += 1
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._probes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        if self.on_state_change is not None:
+            self.on_state_change(previous, state, failure_share)
+        else:
+            logger.warning("Circuit breaker %s -> %s (failure share %.2f)", previous, state, failure_share)
+
+    def allow(self) -> Optional[int]:
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return None
+                self._transition(HALF_OPEN, 0.0)
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    return None
+                self._probes += 1
+            return self._generation
+
+    def record(self, success: bool, ticket: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if ticket != self._generation:
+                return
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED if success else OPEN, 0.0 if success else 1.0)
+                return
+
+            self._outcomes.append((now, not success))
+            self._trim(now)
+            failures = sum(failed for _, failed in self._outcomes)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._transition(OPEN, failures / len(self._outcomes))
+
+
+class AimdLimiter:
+    """Concurrency limit adjusted by additive increase, multiplicative decrease.
+
+    Each successful call raises the limit by increase / limit (about
+    +increase per round of calls), a failed one multiplies it by
+    decrease_factor, bounded by min_limit and max_limit. Calls started
+    before the last decrease were sent at the old limit, so their failures
+    do not decrease it again: a burst of failures halves the limit once.
+    acquire() waits up to timeout seconds for a free slot and returns the
+    monotonic time it was taken, or None when none frees up; release(None)
+    frees the slot of a call that was not made.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, increase: float = 1.0, decrease_factor: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float) -> Optional[float]:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout=timeout):
+                return None
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, success: Optional[bool], started: Optional[float] = None) -> None:
+        """Free a slot; started is the value acquire() returned for the call."""
+        with self._condition:
+            self.in_flight -= 1
+            if success:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            elif success is not None and (started is None or started >= self._last_decrease):
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = time.monotonic()
+            self._condition.notify_all()